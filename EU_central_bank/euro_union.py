@@ -1,7 +1,13 @@
+"""
+Euro-area policy rates, inflation, growth, labour, sentiment, FDI and FX from the ECB Data Portal.
+
+Importing this module only defines ``SERIES`` and the helpers; ``python euro_union.py`` (or
+``main()``) downloads every series and draws the dashboard. pandas, matplotlib and ecbdata are
+imported on first use.
+"""
 from datetime import date, datetime
-import pandas as pd
-import matplotlib.pyplot as plt
-from ecbdata import ecbdata     
+
+from common import metrics
 
 START = "2024-01"
 END   = date.today().strftime("%Y-%m")
@@ -38,13 +44,9 @@ def parse_period(x):
         return f"{year}-{month:02d}-01"
     return x
 
-def fetch(key, name):
-    try:
-        print(f"\nFetching {name}...")
-        raw = ecbdata.get_series(key, start=START, end=END)
-    except Exception as e:
-        print(f"Could not fetch {name}: {e}")
-        return pd.Series(dtype=float)
+def _to_series(raw, name):
+    """Turn one series' SDMX-CSV rows into a float Series indexed by date."""
+    import pandas as pd
 
     idx = "TIME_PERIOD" if "TIME_PERIOD" in raw.columns else "time"
     val = "OBS_VALUE" if "OBS_VALUE" in raw.columns else "value"
@@ -53,77 +55,216 @@ def fetch(key, name):
         print(f"Warning: Could not find value column ({val}) for {name}")
         return pd.Series(dtype=float)
     
-    raw[idx] = raw[idx].apply(parse_period)
-
-    series = (raw
-             .rename(columns={val: name})
-             .assign(**{idx: pd.to_datetime(raw[idx])})
-             .set_index(idx)[name]
-             .astype(float)
-             .sort_index())
+    with metrics.span("ecb.parse", series=name):
+        raw[idx] = raw[idx].apply(parse_period)
+
+        series = (raw
+                 .rename(columns={val: name})
+                 .assign(**{idx: pd.to_datetime(raw[idx])})
+                 .set_index(idx)[name]
+                 .astype(float)
+                 .sort_index())
              
     print(f"Got {len(series)} data points for {name}")
     return series
 
-df = pd.concat({n: fetch(k, n) for n, k in SERIES.items()}, axis=1)
-
-plt.figure(figsize=(16, 20))
-
-# Policy Rates
-ax1 = plt.subplot(4, 2, 1)
-df[["deposit_facility_rate", "mro_rate", "marginal_lending_rate"]].plot(ax=ax1, marker='.')
-ax1.set_title("Key ECB Policy Rates")
-ax1.set_ylabel("% p.a.")
-ax1.grid(True)
-
-# HICP
-ax2 = plt.subplot(4, 2, 2)
-df["hicp_index"].dropna().plot(ax=ax2, marker='o')
-ax2.set_title("HICP All-Items Index (2015 = 100)")
-ax2.grid(True)
-
-# GDP and Unemployment
-ax3 = plt.subplot(4, 2, 3)
-df["gdp_nominal"].dropna().plot(ax=ax3, label="GDP (€ mn)", marker='s')
-ax3.set_ylabel("€ million")
-ax3.tick_params(axis='y')
-ax3.legend(loc="upper left")
-ax3.set_title("GDP and Unemployment")
-ax3.grid(True)
-
-ax3b = ax3.twinx()
-df["unemployment_rate"].dropna().plot(ax=ax3b, ls="--", color="grey", label="Unemployment", marker='o')
-ax3b.set_ylabel("% of labour force")
-ax3b.tick_params(axis='y')
-ax3b.legend(loc="upper right")
-
-# Economic Sentiment
-ax4 = plt.subplot(4, 2, 4)
-df["economic_sentiment"].dropna().plot(ax=ax4, marker='o')
-ax4.set_title("Economic Sentiment Indicator")
-ax4.grid(True)
-
-# FDI
-ax5 = plt.subplot(4, 2, 5)
-df["fdi_liabilities"].dropna().plot(ax=ax5, marker='o', color='purple')
-ax5.set_title("FDI Liabilities (€ million)")
-ax5.set_ylabel("€ million")
-ax5.grid(True)
-
-# Nominal EER-18 (last 6 months)
-ax6 = plt.subplot(4, 2, 6)
-last_date = df.index.max()
-six_months_ago = last_date - pd.DateOffset(months=6)
-df_last_6_months = df[df.index >= six_months_ago]
-df_last_6_months["eur_eer_nominal_18"].dropna().plot(ax=ax6, marker='.')
-ax6.set_title("Nominal EER-18 (Last 6 Months)")
-ax6.grid(True)
-
-# USD/EUR Exchange Rate (last 6 months)
-ax7 = plt.subplot(4, 2, 7)
-df_last_6_months["usd_eur_exchange_rate"].dropna().plot(ax=ax7, marker='.', color='orange')
-ax7.set_title("USD/EUR Exchange Rate (Last 6 Months)")
-ax7.grid(True)
-
-plt.tight_layout()
-plt.show()
+@metrics.timed("ecb.fetch")
+def fetch(key, name):
+    import pandas as pd
+    from ecbdata import ecbdata
+
+    try:
+        print(f"\nFetching {name}...")
+        with metrics.span("ecb.get_series", series=name) as s:
+            raw = ecbdata.get_series(key, start=START, end=END)
+            s.add(rows=len(raw))
+    except Exception as e:
+        print(f"Could not fetch {name}: {e}")
+        return pd.Series(dtype=float)
+
+    return _to_series(raw, name)
+
+def _merge_keys(keys):
+    """Merge same-shaped keys into one SDMX key, ``+``-joining differing dimensions."""
+    dims = [k.split(".") for k in keys]
+    merged = []
+    for values in zip(*dims):
+        seen = list(dict.fromkeys(values))
+        merged.append("+".join(seen))
+    return ".".join(merged)
+
+def _fanout(keys):
+    """Number of series the merged key of *keys* can match (product of per-dimension options)."""
+    n = 1
+    for values in zip(*(k.split(".") for k in keys)):
+        n *= len(set(values))
+    return n
+
+def plan_requests(series=SERIES, max_overfetch=2):
+    """Group *series* into as few SDMX requests as possible.
+
+    Keys of one dataflow with the same number of dimensions are merged with ``+`` syntax.
+    A group whose merged key would match more than ``max_overfetch`` times as many series as
+    requested is instead split into groups that differ in a single dimension only.
+
+    Returns a list of ``(request_key, {series_key: name})`` pairs.
+    """
+    groups = {}
+    for name, key in series.items():
+        flow, rest = key.split(".", 1)
+        groups.setdefault((flow, rest.count(".")), {})[key] = name
+
+    plan = []
+    for members in groups.values():
+        if len(members) == 1 or _fanout(members) <= max_overfetch * len(members):
+            plan.append((_merge_keys(members), members))
+            continue
+        # Too much over-fetch: greedily pull out the largest one-dimension-apart buckets.
+        left = dict(members)
+        while left:
+            best = [next(iter(left))]
+            ndims = best[0].count(".") + 1
+            for pos in range(1, ndims):
+                buckets = {}
+                for key in left:
+                    d = key.split(".")
+                    buckets.setdefault(tuple(d[:pos] + d[pos + 1:]), []).append(key)
+                biggest = max(buckets.values(), key=len)
+                if len(biggest) > len(best):
+                    best = biggest
+            plan.append((_merge_keys(best), {k: left.pop(k) for k in best}))
+    return plan
+
+def fetch_batched(series=SERIES):
+    """Fetch *series* with one ECB request per :func:`plan_requests` group.
+
+    Returns ``{name: Series}``. Groups whose combined request fails, or whose response
+    lacks a ``KEY`` column to split on, fall back to one :func:`fetch` per series.
+    """
+    import pandas as pd
+    from ecbdata import ecbdata
+
+    out = {}
+    for request_key, members in plan_requests(series):
+        if len(members) == 1:
+            (key, name), = members.items()
+            out[name] = fetch(key, name)
+            continue
+
+        try:
+            print(f"\nFetching {', '.join(members.values())} in one request...")
+            with metrics.span("ecb.get_series", series=request_key) as s:
+                raw = ecbdata.get_series(request_key, start=START, end=END)
+                s.add(rows=len(raw))
+        except Exception as e:
+            print(f"Combined request failed ({e}); fetching individually")
+            raw = None
+
+        if raw is None or "KEY" not in raw.columns:
+            out.update({name: fetch(key, name) for key, name in members.items()})
+            continue
+
+        parts = dict(tuple(raw.groupby("KEY", sort=False)))
+        for key, name in members.items():
+            if key in parts:
+                out[name] = _to_series(parts[key].copy(), name)
+            else:
+                print(f"Could not fetch {name}: not in combined response")
+                out[name] = pd.Series(dtype=float)
+    return out
+
+def load(series=SERIES):
+    """Fetch every entry of *series* and align them in one DataFrame."""
+    import pandas as pd
+
+    fetched = fetch_batched(series)
+    return pd.concat({n: fetched[n] for n in series}, axis=1)
+
+def plot(df):
+    """Draw the ECB dashboard for a frame returned by :func:`load`."""
+    import pandas as pd
+    import matplotlib.pyplot as plt
+
+    plt.figure(figsize=(16, 20))
+
+    # Policy Rates
+    ax1 = plt.subplot(4, 2, 1)
+    df[["deposit_facility_rate", "mro_rate", "marginal_lending_rate"]].plot(ax=ax1, marker='.')
+    ax1.set_title("Key ECB Policy Rates")
+    ax1.set_ylabel("% p.a.")
+    ax1.grid(True)
+
+    # HICP
+    ax2 = plt.subplot(4, 2, 2)
+    df["hicp_index"].dropna().plot(ax=ax2, marker='o')
+    ax2.set_title("HICP All-Items Index (2015 = 100)")
+    ax2.grid(True)
+
+    # GDP and Unemployment
+    ax3 = plt.subplot(4, 2, 3)
+    df["gdp_nominal"].dropna().plot(ax=ax3, label="GDP (€ mn)", marker='s')
+    ax3.set_ylabel("€ million")
+    ax3.tick_params(axis='y')
+    ax3.legend(loc="upper left")
+    ax3.set_title("GDP and Unemployment")
+    ax3.grid(True)
+
+    ax3b = ax3.twinx()
+    df["unemployment_rate"].dropna().plot(ax=ax3b, ls="--", color="grey", label="Unemployment", marker='o')
+    ax3b.set_ylabel("% of labour force")
+    ax3b.tick_params(axis='y')
+    ax3b.legend(loc="upper right")
+
+    # Economic Sentiment
+    ax4 = plt.subplot(4, 2, 4)
+    df["economic_sentiment"].dropna().plot(ax=ax4, marker='o')
+    ax4.set_title("Economic Sentiment Indicator")
+    ax4.grid(True)
+
+    # FDI
+    ax5 = plt.subplot(4, 2, 5)
+    df["fdi_liabilities"].dropna().plot(ax=ax5, marker='o', color='purple')
+    ax5.set_title("FDI Liabilities (€ million)")
+    ax5.set_ylabel("€ million")
+    ax5.grid(True)
+
+    # Nominal EER-18 (last 6 months)
+    ax6 = plt.subplot(4, 2, 6)
+    last_date = df.index.max()
+    six_months_ago = last_date - pd.DateOffset(months=6)
+    df_last_6_months = df[df.index >= six_months_ago]
+    df_last_6_months["eur_eer_nominal_18"].dropna().plot(ax=ax6, marker='.')
+    ax6.set_title("Nominal EER-18 (Last 6 Months)")
+    ax6.grid(True)
+
+    # USD/EUR Exchange Rate (last 6 months)
+    ax7 = plt.subplot(4, 2, 7)
+    df_last_6_months["usd_eur_exchange_rate"].dropna().plot(ax=ax7, marker='.', color='orange')
+    ax7.set_title("USD/EUR Exchange Rate (Last 6 Months)")
+    ax7.grid(True)
+
+    plt.tight_layout()
+    return plt.gcf()
+
+def to_warehouse(df, warehouse):
+    """Store a :func:`load` frame in the warehouse ``ecb`` table as (series, date, value) rows."""
+    long = (df.rename_axis("date")
+              .reset_index()
+              .melt(id_vars="date", var_name="series", value_name="value")
+              .dropna(subset=["value"]))
+    return warehouse.write("ecb", long, partition_by=["series"], mode="overwrite",
+                           source="euro_union")
+
+def main():
+    import matplotlib.pyplot as plt
+    from common.warehouse import default as default_warehouse
+
+    df = load()
+    warehouse = default_warehouse()
+    if warehouse is not None:
+        print(f"Stored {to_warehouse(df, warehouse)} observations in {warehouse.root}")
+    plot(df)
+    plt.show()
+
+if __name__ == "__main__":
+    main()
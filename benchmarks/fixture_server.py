@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Schwab, ArcGIS (PortWatch) and ECB endpoints.
+
+Responses are replayed from the recorded samples in ``fixtures/`` and fanned out to the size a
+scenario asks for (number of symbols, pages, observations), so every fetch path in the repo can
+run offline against a deterministic server.
+
+Point the fetchers at it with the environment overrides they already honour:
+
+    SCHWAB_MARKETDATA_URL = <base>/marketdata/v1
+    SCHWAB_TOKEN_URL      = <base>/v1/oauth/token
+    ARCGIS_PORTAL         = <base>
+    ecbdata.api.WSENTRYPOINT = <base>          (module attribute, see run.py)
+
+Knobs
+-----
+latency     seconds added to every response (plus uniform *jitter*)
+pages       number of full pages an ArcGIS layer reports before it runs dry
+error_rate  fraction of requests answered with HTTP 503 (seeded, so runs are repeatable)
+
+Usage
+-----
+```bash
+$ python benchmarks/fixture_server.py --port 8765 --latency 0.05 --pages 20 --error-rate 0.01
+$ python benchmarks/fixture_server.py --record https://www.arcgis.com/sharing/rest/content/items/<id>?f=json \\
+      --to fixtures/arcgis_item.json
+```
+"""
+import argparse
+import csv
+import io
+import itertools
+import json
+import random
+import threading
+import time
+import zlib
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+# ArcGIS item-id → recorded row template (mirrors portwatch_imf._DATASETS)
+ARCGIS_ITEMS = {
+    "959214444157458aad969389b3ebe1a0": "arcgis_port_activity.json",
+    "42132aa4e2fc4d41bdaf9a445f688931": "arcgis_chokepoint_daily.json",
+    "acc668d199d1472abaaf2467133d4ca4": "arcgis_ports_meta.json",
+    "fa9a5800b0ee4855af8b2944ab1e07af": "arcgis_chokepoints_meta.json",
+}
+
+_DAY_MS = 86_400_000
+
+
+def _load_json(name: str) -> dict:
+    return json.loads((FIXTURES / name).read_text())
+
+
+class FixtureServer:
+    """Threaded HTTP server replaying recorded responses; use as a context manager."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, *,
+                 latency: float = 0.0, jitter: float = 0.0, pages: int = 5,
+                 error_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.pages = pages
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+        self._quote = _load_json("schwab_quote.json")
+        self._token = _load_json("schwab_token.json")
+        self._rows = {item: _load_json(name)["attributes"] for item, name in ARCGIS_ITEMS.items()}
+        with open(FIXTURES / "ecb_series.csv", newline="") as f:
+            self._ecb_row = next(csv.DictReader(f))
+
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FixtureServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "FixtureServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ------------------------------------------------------------------ routing
+
+    def _should_fail(self) -> bool:
+        with self._lock:
+            self.requests += 1
+            fail = self.error_rate > 0 and self._rng.random() < self.error_rate
+            if fail:
+                self.errors += 1
+            delay = self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+        return fail
+
+    def route(self, method: str, path: str, query: dict) -> tuple:
+        """Return ``(status, content_type, body_bytes)`` for a request."""
+        if self._should_fail():
+            return 503, "application/json", b'{"error": "injected failure"}'
+
+        parts = [p for p in path.split("/") if p]
+        if method == "POST" and path.rstrip("/").endswith("/oauth/token"):
+            return self._json(self._token)
+        if parts[-1:] == ["pricehistory"]:
+            return self._json(self._price_history(query.get("symbol", [""])[0], query))
+        if parts[-1:] == ["quotes"]:
+            symbols = query.get("symbols", [""])[0].split(",")
+            return self._json(self._quotes(symbols))
+        if parts[:4] == ["sharing", "rest", "content", "items"] and len(parts) == 5:
+            return self._json({"id": parts[4], "url": f"{self.base_url}/arcgis/{parts[4]}/FeatureServer"})
+        if parts[:1] == ["arcgis"] and parts[-1:] == ["query"]:
+            return self._json(self._features(parts[1], query))
+        if parts[:2] == ["service", "data"] and len(parts) == 4:
+            return 200, "text/csv", self._sdmx_csv(parts[2], parts[3], query).encode()
+        return 404, "application/json", json.dumps({"error": f"no fixture for {path}"}).encode()
+
+    @staticmethod
+    def _json(obj) -> tuple:
+        return 200, "application/json", json.dumps(obj).encode()
+
+    def _quotes(self, symbols: list) -> dict:
+        out = {}
+        for i, sym in enumerate(s for s in symbols if s):
+            q = dict(self._quote["quote"])
+            drift = 1 + ((i * 37) % 21 - 10) / 100
+            q["lastPrice"] = round(q["lastPrice"] * drift, 4)
+            q["totalVolume"] = q["totalVolume"] + i * 1000
+            out[sym] = {**self._quote, "symbol": sym, "quote": q}
+        return out
+
+    def _price_history(self, symbol: str, query: dict) -> dict:
+        years = int(query.get("period", ["1"])[0])
+        q = self._quote["quote"]
+        seed = zlib.crc32(symbol.encode())
+        end = date.today()
+        days = [end - timedelta(days=k) for k in range(365 * years, -1, -1)]
+        candles, price = [], q["lastPrice"] * (0.5 + (seed % 100) / 100)
+        for j, d in enumerate(x for x in days if x.weekday() < 5):
+            price *= 1 + (((seed + j * 7919) % 41) - 20) / 1000
+            candles.append({"open": round(price, 4), "high": round(price * 1.01, 4),
+                            "low": round(price * 0.99, 4), "close": round(price, 4),
+                            "volume": q["totalVolume"] + (seed + j * 104729) % 50_000,
+                            "datetime": int(datetime(d.year, d.month, d.day).timestamp() * 1000)})
+        return {"symbol": symbol, "empty": not candles, "candles": candles}
+
+    def _features(self, item_id: str, query: dict) -> dict:
+        template = self._rows.get(item_id)
+        if template is None:
+            return {"error": {"code": 400, "message": f"unknown layer {item_id}"}}
+        size = int(query.get("resultRecordCount", ["2000"])[0])
+        total = self.pages * size
+        if query.get("returnCountOnly", ["false"])[0] == "true":
+            return {"count": total}
+        offset = int(query.get("resultOffset", ["0"])[0])
+        n = max(min(size, total - offset), 0)
+        features = []
+        for k in range(offset, offset + n):
+            row = dict(template)
+            row["ObjectId"] = k + 1
+            if "day" in row:
+                row["day"] = template["day"] - (k // 100) * _DAY_MS
+            for id_col in ("portid", "chokepointid"):
+                if id_col in row:
+                    row[id_col] = template[id_col] + k % 100
+            features.append({"attributes": row})
+        return {"features": features, "exceededTransferLimit": offset + n < total}
+
+    def _sdmx_csv(self, flow: str, key: str, query: dict) -> str:
+        dims = [d.split("+") for d in key.split(".")]
+        start = query.get("startPeriod", ["2024-01"])[0]
+        end = query.get("endPeriod", [date.today().strftime("%Y-%m")])[0]
+        buf = io.StringIO()
+        writer = csv.DictWriter(buf, fieldnames=list(self._ecb_row))
+        writer.writeheader()
+        for combo in itertools.product(*dims):
+            series_key = f"{flow}.{'.'.join(combo)}"
+            base = float(self._ecb_row["OBS_VALUE"]) * (1 + (zlib.crc32(series_key.encode()) % 50) / 100)
+            for j, period in enumerate(_periods(combo[0], start, end)):
+                writer.writerow({**self._ecb_row, "KEY": series_key, "FREQ": combo[0],
+                                 "TIME_PERIOD": period,
+                                 "OBS_VALUE": round(base * (1 + 0.001 * (j % 17)), 4)})
+        return buf.getvalue()
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _serve(self, method: str):
+                url = urlsplit(self.path)
+                query = parse_qs(url.query)
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    self.rfile.read(length)
+                status, ctype, body = server.route(method, url.path, query)
+                self.send_response(status)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                self._serve("GET")
+
+            def do_POST(self):
+                self._serve("POST")
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def _periods(freq: str, start: str, end: str):
+    """SDMX reporting periods of frequency *freq* between two ``YYYY-MM[-DD]`` bounds."""
+    d0 = date.fromisoformat(start if len(start) > 7 else f"{start}-01")
+    d1 = date.fromisoformat(end if len(end) > 7 else f"{end}-28")
+    if freq == "D":
+        d = d0
+        while d <= d1:
+            if d.weekday() < 5:
+                yield d.isoformat()
+            d += timedelta(days=1)
+        return
+    y, m = d0.year, d0.month
+    while (y, m) <= (d1.year, d1.month):
+        if freq == "M":
+            yield f"{y}-{m:02d}"
+        elif freq == "Q" and m % 3 == 1:
+            yield f"{y}-Q{(m - 1) // 3 + 1}"
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+
+
+def record(url: str, dest: Path, **kw):
+    """Fetch *url* live and store the body as a fixture (JSON is pretty-printed)."""
+    import requests
+
+    resp = requests.get(url, timeout=120, **kw)
+    resp.raise_for_status()
+    try:
+        dest.write_text(json.dumps(resp.json(), indent=2))
+    except ValueError:
+        dest.write_bytes(resp.content)
+    print(f"[✓] recorded {len(resp.content):,} bytes → {dest}")
+
+
+def main():
+    p = argparse.ArgumentParser(description="Replay recorded API responses locally.")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--latency", type=float, default=0.0, help="seconds per response")
+    p.add_argument("--jitter", type=float, default=0.0, help="extra uniform random latency")
+    p.add_argument("--pages", type=int, default=5, help="full pages per ArcGIS layer")
+    p.add_argument("--error-rate", type=float, default=0.0, help="fraction of 503 responses")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--record", metavar="URL", help="capture a live response instead of serving")
+    p.add_argument("--to", type=Path, help="fixture file written by --record")
+    args = p.parse_args()
+
+    if args.record:
+        record(args.record, args.to or FIXTURES / "recorded.json")
+        return
+
+    server = FixtureServer(args.host, args.port, latency=args.latency, jitter=args.jitter,
+                           pages=args.pages, error_rate=args.error_rate, seed=args.seed)
+    print(f"Serving fixtures on {server.base_url} (Ctrl-C to stop)")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
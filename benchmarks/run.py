@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Offline end-to-end benchmarks for the fetch and render paths.
+
+Every fetcher is pointed at a local :class:`fixture_server.FixtureServer`, then each scenario is
+run ``--repeat`` times for latency percentiles and throughput, plus once more under
+``tracemalloc`` for peak Python memory. Results land in ``results/<label>.json`` (label defaults
+to the current git commit) and are compared against the previous run so regressions stand out.
+
+Scenarios
+---------
+quotes      custom_quotes.get_quotes for ``--symbols`` tickers
+portwatch   portwatch_imf.get_port_activity over ``--pages`` pages of 2000 rows
+ecb         euro_union.fetch for every entry in euro_union.SERIES
+tokens      schwab.retrieve_tokens
+charts      every create_charts.create_* on a synthetic ``--symbols``-row analysis frame
+
+Usage
+-----
+```bash
+$ python benchmarks/run.py                          # all scenarios, compare with latest result
+$ python benchmarks/run.py -s quotes portwatch --latency 0.02 --repeat 20
+$ python benchmarks/run.py --baseline results/abc1234.json --fail-on-regression
+```
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+from fixture_server import FixtureServer
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS = Path(__file__).resolve().parent / "results"
+
+for _sub in ("schwab_realtime_data", "global_trade_shipping", "EU_central_bank"):
+    sys.path.insert(0, str(ROOT / _sub))
+
+SCENARIOS = ("quotes", "portwatch", "ecb", "tokens", "charts")
+
+# metric → True if larger is better
+METRICS = {"p50_ms": False, "p90_ms": False, "p99_ms": False,
+           "throughput": True, "peak_mem_mb": False, "error_rate": False}
+
+
+def _percentile(values: list, q: float) -> float:
+    xs = sorted(values)
+    k = (len(xs) - 1) * q / 100
+    lo = int(k)
+    hi = min(lo + 1, len(xs) - 1)
+    return xs[lo] + (xs[hi] - xs[lo]) * (k - lo)
+
+
+def _git_label() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return datetime.now().strftime("%Y%m%d_%H%M%S")
+
+
+def _attempt(fn):
+    """Run *fn* once; returns ``(units, error)`` so one failed call does not end the run."""
+    try:
+        return fn(), None
+    except Exception as e:
+        return 0, f"{type(e).__name__}: {str(e)[:80]}"
+
+
+def measure(fn, repeat: int, unit: str) -> dict:
+    """Time *fn* (which returns the number of *unit* it processed) and record peak memory.
+
+    Calls that raise (e.g. under ``--error-rate``) are counted as errors; latency percentiles
+    and throughput cover the successful calls only.
+    """
+    _attempt(fn)  # warm-up: imports, connection pools, font caches
+    times, units, errors = [], 0, {}
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        n, error = _attempt(fn)
+        elapsed = time.perf_counter() - t0
+        if error is None:
+            units += n
+            times.append(elapsed)
+        else:
+            errors[error] = errors.get(error, 0) + 1
+
+    tracemalloc.start()
+    _attempt(fn)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    ms = (lambda q: 1000 * _percentile(times, q)) if times else (lambda q: None)
+    return {
+        "calls": repeat,
+        "unit": unit,
+        "errors": sum(errors.values()),
+        "error_rate": sum(errors.values()) / repeat,
+        "error_kinds": errors,
+        "mean_ms": 1000 * sum(times) / len(times) if times else None,
+        "p50_ms": ms(50),
+        "p90_ms": ms(90),
+        "p99_ms": ms(99),
+        "throughput": units / sum(times) if times else 0.0,
+        "peak_mem_mb": peak / 2**20,
+    }
+
+
+def _analysis_frame(n: int):
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(0)
+    cols = ["price_roc_1d", "price_roc_1m", "price_roc_ytd", "price_roc_3y",
+            "price_vs_sma20", "price_vs_sma50", "price_vs_sma200",
+            "volume_roc_1d", "volume_roc_1m", "volume_vs_avg"]
+    df = pd.DataFrame(rng.normal(0, 20, size=(n, len(cols))), columns=cols)
+    df.insert(0, "symbol", [f"SYM{i:03d}" for i in range(n)])
+    df["volatility_30d"] = rng.uniform(10, 60, n)
+    df["avg_volume_30d"] = rng.uniform(1e5, 3e7, n)
+    df["current_price"] = rng.uniform(5, 400, n)
+    return df
+
+
+def build_scenarios(args) -> dict:
+    """Return ``{name: (callable, unit)}`` for the requested scenarios (imports lazily)."""
+    out = {}
+    if "quotes" in args.scenarios:
+        import custom_quotes
+        symbols = [f"SYM{i:04d}" for i in range(args.symbols)]
+        def _quotes():
+            df = custom_quotes.get_quotes(symbols)
+            if df is None:  # get_quotes logs and returns None on HTTP errors
+                raise RuntimeError("get_quotes returned no data")
+            return len(df)
+        out["quotes"] = (_quotes, "rows")
+    if "portwatch" in args.scenarios:
+        import portwatch_imf
+        out["portwatch"] = (lambda: len(portwatch_imf.get_port_activity("2024-07-01", "2025-06-30")),
+                            "rows")
+    if "ecb" in args.scenarios:
+        import euro_union
+        def _ecb():
+            return sum(len(euro_union.fetch(k, n)) for n, k in euro_union.SERIES.items())
+        out["ecb"] = (_ecb, "observations")
+    if "tokens" in args.scenarios:
+        import schwab
+        def _tokens():
+            schwab.retrieve_tokens({}, {"grant_type": "authorization_code"})
+            return 1
+        out["tokens"] = (_tokens, "calls")
+    if "charts" in args.scenarios:
+        import matplotlib.pyplot as plt
+        import create_charts
+        df = _analysis_frame(args.symbols)
+        renderers = [create_charts.create_performance_chart, create_charts.create_volume_analysis_chart,
+                     create_charts.create_risk_return_chart, create_charts.create_summary_dashboard]
+        def _charts():
+            for render in renderers:
+                render(df)
+                plt.close("all")
+            return len(renderers)
+        out["charts"] = (_charts, "charts")
+    return out
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list:
+    """Return ``(scenario, metric, old, new, pct)`` tuples that moved the wrong way by > *threshold* %."""
+    regressions = []
+    for name, cur in current.items():
+        old = baseline.get(name)
+        if not old:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            a, b = old.get(metric), cur.get(metric)
+            if metric == "error_rate" and a == 0 and b:
+                regressions.append((name, metric, a, b, float("inf")))
+                continue
+            if not a or b is None:
+                continue
+            pct = 100 * (b - a) / a
+            if (-pct if higher_is_better else pct) > threshold:
+                regressions.append((name, metric, a, b, pct))
+    return regressions
+
+
+def _latest_result(exclude: Path) -> Path | None:
+    files = sorted((p for p in RESULTS.glob("*.json") if p != exclude), key=lambda p: p.stat().st_mtime)
+    return files[-1] if files else None
+
+
+def main():
+    p = argparse.ArgumentParser(description="Offline benchmarks against the fixture server.")
+    p.add_argument("-s", "--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    p.add_argument("--repeat", type=int, default=10)
+    p.add_argument("--symbols", type=int, default=50, help="tickers for quotes/charts")
+    p.add_argument("--pages", type=int, default=5, help="ArcGIS pages (2000 rows each)")
+    p.add_argument("--latency", type=float, default=0.0, help="seconds added per response")
+    p.add_argument("--jitter", type=float, default=0.0)
+    p.add_argument("--error-rate", type=float, default=0.0)
+    p.add_argument("--label", help="results file name (default: git short sha)")
+    p.add_argument("--baseline", type=Path, help="results file to compare with (default: latest)")
+    p.add_argument("--threshold", type=float, default=10.0, help="regression threshold in %%")
+    p.add_argument("--fail-on-regression", action="store_true")
+    args = p.parse_args()
+
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    server = FixtureServer(latency=args.latency, jitter=args.jitter, pages=args.pages,
+                           error_rate=args.error_rate).start()
+    os.environ["SCHWAB_MARKETDATA_URL"] = f"{server.base_url}/marketdata/v1"
+    os.environ["SCHWAB_TOKEN_URL"] = f"{server.base_url}/v1/oauth/token"
+    os.environ["ARCGIS_PORTAL"] = server.base_url
+    import ecbdata.api
+    ecbdata.api.WSENTRYPOINT = server.base_url
+
+    results = {}
+    cwd = os.getcwd()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)  # tokens.json lookup and chart PNGs stay out of the tree
+            Path("tokens.json").write_text(json.dumps({"access_token": "fixture-access-token"}))
+            for name, (fn, unit) in build_scenarios(args).items():
+                print(f"Benchmarking {name} …", flush=True)
+                results[name] = measure(fn, args.repeat, unit)
+    finally:
+        os.chdir(cwd)
+        server.stop()
+
+    label = args.label or _git_label()
+    out = RESULTS / f"{label}.json"
+    RESULTS.mkdir(exist_ok=True)
+    out.write_text(json.dumps({
+        "label": label,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("baseline",)},
+        "results": results,
+    }, indent=2, default=str))
+
+    def _ms(v):
+        return f"{v:>10.1f}" if v is not None else f"{'-':>10}"
+
+    print(f"\n{'scenario':<10} {'p50 ms':>10} {'p90 ms':>10} {'p99 ms':>10} {'throughput':>17} {'peak MB':>9} "
+          f"{'errors':>8}")
+    print("-" * 79)
+    for name, r in results.items():
+        print(f"{name:<10} {_ms(r['p50_ms'])} {_ms(r['p90_ms'])} {_ms(r['p99_ms'])} "
+              f"{r['throughput']:>10,.0f} {r['unit'][:6]:<6} {r['peak_mem_mb']:>9.1f} "
+              f"{r['errors']:>3}/{r['calls']:<4}")
+    for name, r in results.items():
+        for kind, n in r["error_kinds"].items():
+            print(f"  {name}: {n}× {kind}")
+    if server.errors:
+        print(f"\n{server.errors} injected failure(s) out of {server.requests} requests")
+    print(f"\n[✓] results → {out}")
+
+    base = args.baseline or _latest_result(exclude=out)
+    if base is None:
+        return
+    regressions = compare(results, json.loads(base.read_text())["results"], args.threshold)
+    if not regressions:
+        print(f"No regressions > {args.threshold:.0f}% vs {base.name}")
+        return
+    print(f"\nRegressions vs {base.name}:")
+    for name, metric, a, b, pct in regressions:
+        print(f"  {name:<10} {metric:<12} {a:>10.2f} → {b:>10.2f} ({pct:+.1f}%)")
+    if args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
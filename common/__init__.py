@@ -0,0 +1 @@
+"""Helpers shared by the data-fetching and reporting scripts."""
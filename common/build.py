@@ -0,0 +1,249 @@
+"""
+Incremental, parallel builds over a DAG of file-producing stages.
+
+A :class:`Stage` names an action (a module-level function, so it can run in a worker process),
+the stages it depends on, the files it reads and the files it writes. Before a stage runs, its
+key is computed as a SHA-256 over:
+
+* the action (its name and source code) and its parameters
+* the content of its input files
+* the content hashes of its dependencies' outputs
+
+The stage is rebuilt only when that key differs from the one recorded at its last successful
+run, when one of its outputs is missing or was modified since, or when it is older than its
+``max_age`` (for stages that read external data). A dependency that reruns but writes
+byte-identical outputs therefore leaves everything downstream fresh.
+
+Ready stages run concurrently in a process pool, so independent branches of the graph use
+separate cores. State is kept in a small JSON file and saved after every stage.
+
+Usage
+-----
+```python
+from common.build import Pipeline, Stage
+
+p = Pipeline("build/.state.json")
+p.add(Stage("fetch", fetch_prices, outputs=["build/prices.parquet"], max_age=12 * 3600))
+p.add(Stage("charts", draw, deps=["fetch"], inputs=["charts.py"], outputs=["build/chart.png"]))
+p.run(jobs=4)
+```
+"""
+import fnmatch
+import hashlib
+import inspect
+import json
+import os
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+BUILT, FRESH, FAILED, SKIPPED = "built", "fresh", "failed", "skipped"
+
+
+def file_hash(path) -> Optional[str]:
+    """SHA-256 of the file at *path*, or ``None`` when it does not exist."""
+    h = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+    except FileNotFoundError:
+        return None
+    return h.hexdigest()
+
+
+class Stage:
+    """One node of the build graph; see the module docstring."""
+
+    def __init__(self, name: str, action: Callable, *, deps: Sequence[str] = (),
+                 inputs: Sequence = (), outputs: Sequence = (), params: Optional[dict] = None,
+                 max_age: Optional[float] = None):
+        self.name = name
+        self.action = action
+        self.deps = list(deps)
+        self.inputs = [str(p) for p in inputs]
+        self.outputs = [str(p) for p in outputs]
+        self.params = dict(params or {})
+        self.max_age = max_age
+
+    def __repr__(self):
+        return f"Stage({self.name!r})"
+
+
+def _run_action(action: Callable, params: dict):
+    """Worker-side wrapper: run one action and report (seconds, error text or None)."""
+    t0 = time.perf_counter()
+    try:
+        action(**params)
+        return time.perf_counter() - t0, None
+    except Exception:
+        return time.perf_counter() - t0, traceback.format_exc()
+
+
+class Pipeline:
+    """A set of stages plus the record of their last successful builds."""
+
+    def __init__(self, state_path="build/.state.json"):
+        self.state_path = Path(state_path)
+        self.stages: Dict[str, Stage] = {}
+
+    def add(self, stage: Stage) -> Stage:
+        """Register *stage*; its dependencies must already be registered (which keeps it acyclic)."""
+        if stage.name in self.stages:
+            raise ValueError(f"duplicate stage {stage.name!r}")
+        unknown = [d for d in stage.deps if d not in self.stages]
+        if unknown:
+            raise ValueError(f"{stage.name}: unknown dependencies {unknown}")
+        self.stages[stage.name] = stage
+        return stage
+
+    # ------------------------------------------------------------------ state
+
+    def _load_state(self) -> dict:
+        if not self.state_path.exists():
+            return {}
+        return json.loads(self.state_path.read_text())
+
+    def _save_state(self, state: dict):
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(state, indent=2, sort_keys=True))
+        os.replace(tmp, self.state_path)
+
+    # ------------------------------------------------------------------ planning
+
+    def select(self, patterns: Optional[Iterable[str]] = None) -> List[Stage]:
+        """Stages matching any of *patterns* (globs; all by default) plus everything upstream,
+        in dependency order."""
+        names = list(self.stages)
+        if patterns:
+            wanted = {n for n in names if any(fnmatch.fnmatch(n, p) for p in patterns)}
+            if not wanted:
+                raise KeyError(f"no stage matches {list(patterns)}")
+            todo = list(wanted)
+            while todo:
+                for d in self.stages[todo.pop()].deps:
+                    if d not in wanted:
+                        wanted.add(d)
+                        todo.append(d)
+            names = [n for n in names if n in wanted]
+        return [self.stages[n] for n in names]
+
+    @staticmethod
+    def _source_hash(action: Callable) -> Optional[str]:
+        """SHA-256 of *action*'s source, so editing its body invalidates the stage.
+
+        Code it calls in other modules is not covered; list those files in ``inputs``.
+        """
+        try:
+            source = inspect.getsource(action)
+        except (OSError, TypeError):                     # builtins, C extensions, REPL definitions
+            return None
+        return hashlib.sha256(source.encode()).hexdigest()
+
+    def _key(self, stage: Stage, state: dict) -> str:
+        payload = {
+            "action": stage.action.__qualname__,
+            "source": self._source_hash(stage.action),
+            "params": stage.params,
+            "inputs": {p: file_hash(p) for p in stage.inputs},
+            "deps": {d: state.get(d, {}).get("outputs") for d in stage.deps},
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _stale(self, stage: Stage, key: str, record: Optional[dict], forced: bool) -> Optional[str]:
+        """Why *stage* must be rebuilt, or ``None`` when it is up to date."""
+        if forced:
+            return "forced"
+        if record is None:
+            return "never built"
+        if record["key"] != key:
+            return "inputs changed"
+        for path, digest in record["outputs"].items():
+            now = file_hash(path)
+            if now is None:
+                return f"{path} missing"
+            if now != digest:
+                return f"{path} modified"
+        if stage.max_age is not None and time.time() - record["built_at"] > stage.max_age:
+            return "older than max_age"
+        return None
+
+    # ------------------------------------------------------------------ running
+
+    def run(self, targets: Optional[Iterable[str]] = None, *, jobs: Optional[int] = None,
+            force: Iterable[str] = (), dry_run: bool = False,
+            log: Callable[[str], None] = print) -> Dict[str, str]:
+        """Bring the selected stages up to date; returns ``{stage: built|fresh|failed|skipped}``.
+
+        *force* holds globs of stages to rebuild regardless of their state. With *dry_run*
+        nothing runs: stale stages (and everything downstream of them) are reported as ``built``.
+        """
+        order = self.select(targets)
+        force = list(force)
+        state = self._load_state()
+        status: Dict[str, str] = {}
+        pending = {s.name: s for s in order}
+
+        def forced(name):
+            return any(fnmatch.fnmatch(name, p) for p in force)
+
+        def ready():
+            return [s for s in pending.values() if all(d in status for d in s.deps)]
+
+        if dry_run:
+            for stage in order:
+                upstream = [d for d in stage.deps if status.get(d) == BUILT]
+                key = self._key(stage, state)
+                why = (f"upstream {', '.join(upstream)} stale" if upstream
+                       else self._stale(stage, key, state.get(stage.name), forced(stage.name)))
+                status[stage.name] = BUILT if why else FRESH
+                log(f"[{'…' if why else '='}] {stage.name}: {why or 'up to date'}")
+            return status
+
+        with ProcessPoolExecutor(max_workers=jobs or os.cpu_count()) as pool:
+            running = {}
+            while pending or running:
+                for stage in ready():
+                    del pending[stage.name]
+                    bad = [d for d in stage.deps if status.get(d) in (FAILED, SKIPPED)]
+                    if bad:
+                        status[stage.name] = SKIPPED
+                        log(f"[-] {stage.name}: skipped ({', '.join(bad)} failed)")
+                        continue
+                    key = self._key(stage, state)
+                    why = self._stale(stage, key, state.get(stage.name), forced(stage.name))
+                    if why is None:
+                        status[stage.name] = FRESH
+                        log(f"[=] {stage.name}: up to date")
+                        continue
+                    log(f"[…] {stage.name}: {why}")
+                    for out in stage.outputs:
+                        Path(out).parent.mkdir(parents=True, exist_ok=True)
+                    running[pool.submit(_run_action, stage.action, stage.params)] = (stage, key)
+
+                if not running:
+                    continue
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    stage, key = running.pop(fut)
+                    try:
+                        seconds, error = fut.result()
+                    except Exception as e:          # worker died or result not picklable
+                        seconds, error = 0.0, repr(e)
+                    outputs = {p: file_hash(p) for p in stage.outputs}
+                    missing = [p for p, h in outputs.items() if h is None]
+                    if error is None and missing:
+                        error = f"did not write {', '.join(missing)}"
+                    if error is not None:
+                        status[stage.name] = FAILED
+                        log(f"[✗] {stage.name}: {error.rstrip()}")
+                        continue
+                    state[stage.name] = {"key": key, "outputs": outputs, "built_at": time.time(),
+                                         "seconds": round(seconds, 3)}
+                    self._save_state(state)
+                    status[stage.name] = BUILT
+                    log(f"[✓] {stage.name} ({seconds:.1f}s)")
+        return status
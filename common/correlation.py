@@ -0,0 +1,261 @@
+"""
+Rolling cross-asset correlation and beta matrices (shipping vs autos vs FX).
+
+Series are aligned on a common business-day calendar, turned into returns, and every pair's
+rolling covariance is computed at once. Windowed sums are updated incrementally — each date adds
+the outer product of the newest row and subtracts the one leaving the window — in time blocks
+sized to a memory budget, so there are no per-pair Python loops. Missing observations are
+handled pairwise (like ``DataFrame.rolling(...).corr()``); stretches with complete windows skip
+the bookkeeping and reduce each centred window with one batched matrix product.
+
+Usage
+-----
+```python
+from common import correlation as xc
+
+frame = xc.align({"usd_eur": fx, "suez": suez_calls, "VWAGY": vw})
+rets = xc.returns(frame)
+for dates, corr in xc.iter_rolling(rets, window=60):    # (B, N, N) blocks, bounded memory
+    ...
+month_ends = rets.resample("BME").last().index
+corr = xc.rolling_matrices(rets, window=60, dates=month_ends)   # (len(dates), N, N)
+last_corr, last_beta = xc.latest(rets, window=60)       # N×N DataFrames
+```
+
+Memory: :func:`iter_rolling` keeps its working set near ``max_block_bytes`` (64 MB by default)
+plus the input, whatever the history length. :func:`rolling_matrices` returns one N×N float64
+matrix per requested date, ``8·N²`` bytes each. For 300 series that is 720 kB a date, or 1.8 GB
+for ten years of business days, so it refuses results over ``max_bytes`` (1 GB) unless raised.
+Pass ``dates=`` or stream with :func:`iter_rolling` instead.
+
+``python common/correlation.py --warehouse warehouse`` prints the strongest pairs from the
+warehouse's ``chokepoint_transit``, ``ecb`` and ``quotes`` tables.
+"""
+import argparse
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+_STATS = ("corr", "beta", "cov")
+
+
+def align(series: Dict[str, pd.Series], freq: str = "B", ffill_limit: Optional[int] = 5) -> pd.DataFrame:
+    """Put *series* on one calendar of frequency *freq*, forward-filling short gaps only."""
+    frame = pd.concat({k: s.groupby(level=0).last() for k, s in series.items()}, axis=1, sort=True)
+    frame.index = pd.DatetimeIndex(frame.index).tz_localize(None).normalize()
+    frame = frame.groupby(level=0).last()
+    calendar = pd.date_range(frame.index.min(), frame.index.max(), freq=freq)
+    return frame.reindex(frame.index.union(calendar)).ffill(limit=ffill_limit).reindex(calendar)
+
+
+def returns(frame: pd.DataFrame, method: str = "log") -> pd.DataFrame:
+    """Per-period changes: ``log`` returns (non-positive levels → NaN), ``pct`` or plain ``diff``."""
+    if method == "log":
+        return np.log(frame.where(frame > 0)).diff()
+    if method == "pct":
+        return frame.pct_change(fill_method=None)
+    if method == "diff":
+        return frame.diff()
+    raise ValueError(f"unknown method {method!r}")
+
+
+def _complete_block(x: np.ndarray, a: int, b: int, window: int, stat: str) -> np.ndarray:
+    """Rolling *stat* for dates ``a..b-1`` whose full windows have no missing values.
+
+    Each window is centred and reduced with one batched matrix product, so the (B, N, N) result
+    is written once instead of being built up through several elementwise passes.
+    """
+    win = sliding_window_view(x[a - window + 1:b], window, axis=0)  # (B, N, window), no copy
+    c = win - win.mean(axis=2, keepdims=True)
+    ss = np.einsum("bnw,bnw->bn", c, c)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if stat == "cov":
+            return np.matmul(c, c.transpose(0, 2, 1)) / (window - 1)
+        if stat == "beta":
+            return np.matmul(c, (c / ss[:, :, None]).transpose(0, 2, 1))
+        z = c / np.sqrt(ss)[:, :, None]
+        return np.clip(np.matmul(z, z.transpose(0, 2, 1)), -1.0, 1.0)
+
+
+# row weights for one incremental window update: the entering row is added, the leaving one removed
+_IN, _IN_OUT = np.array([[1.0]]), np.array([[1.0], [-1.0]])
+
+
+def _finish_pairwise(n, sx, sxx, sxy, stat: str, min_periods: int, out: np.ndarray):
+    """Write *stat* for one date into *out* (N×N) from its pairwise window sums.
+
+    ``n·Σ(x-x̄)(y-ȳ) = n·sxy - sx·syᵀ`` and ``n·Σ(x-x̄)² = n·sxx - sx²`` over the rows each pair
+    shares; the common ``n`` and ``n - 1`` factors cancel in ``corr`` and ``beta``. The variance
+    of column *j* over the rows it shares with *i* is the transpose of the one for *i*.
+    """
+    np.multiply(sxy, n, out=out)
+    out -= sx * sx.T
+    var = sxx * n
+    var -= sx * sx
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if stat == "cov":
+            out /= n * (n - 1)
+        elif stat == "beta":
+            out /= var.T
+        else:
+            out /= np.sqrt(var * var.T)
+            np.clip(out, -1.0, 1.0, out=out)
+    np.copyto(out, np.nan, where=n < max(min_periods, 2))
+
+
+def _pairwise_block(x: np.ndarray, m: np.ndarray, xx2: np.ndarray, a: int, b: int,
+                    window: int, stat: str, min_periods: int) -> np.ndarray:
+    """Rolling *stat* for dates ``a..b-1`` with pairwise handling of missing values.
+
+    With ``m`` the observed mask, ``x`` zero-filled and ``xx2 = [x | x²]``, the window sums
+    ``n = Σ m_i m_j``, ``sx = Σ x_i m_j``, ``sxx = Σ x_i² m_j`` and ``sxy = Σ x_i x_j`` are
+    computed exactly for the window ending at ``a-1``, then moved one date at a time: the
+    entering row is added and the leaving row removed with one rank-2 product per sum. Only
+    N×N arrays are live besides the (B, N, N) result.
+    """
+    k = x.shape[1]
+    lo = max(a - window, 0)
+    n = m[lo:a].T @ m[lo:a]
+    s = xx2[lo:a].T @ m[lo:a]                       # [sx; sxx], (2N, N)
+    sxy = x[lo:a].T @ x[lo:a]
+    out = np.empty((b - a, k, k))
+    for t in range(a, b):
+        rows, sign = ([t, t - window], _IN_OUT) if t >= window else ([t], _IN)
+        n += (m[rows] * sign).T @ m[rows]
+        s += (xx2[rows] * sign).T @ m[rows]
+        sxy += (x[rows] * sign).T @ x[rows]
+        _finish_pairwise(n, s[:k], s[k:], sxy, stat, min_periods, out[t - a])
+    return out
+
+
+def iter_rolling(frame: pd.DataFrame, window: int, *, stat: str = "corr",
+                 min_periods: Optional[int] = None, start: int = 0,
+                 max_block_bytes: int = 64 * 2**20) -> Iterator[Tuple[pd.DatetimeIndex, np.ndarray]]:
+    """Yield ``(dates, matrices)`` blocks of rolling *stat* for every pair of columns.
+
+    Blocks cover row positions ``start`` onwards (earlier rows are only read as window history).
+
+    ``matrices[k, i, j]`` is the statistic of column *i* against column *j* at ``dates[k]``;
+    for ``beta`` that is the slope of *i* regressed on *j*. Blocks are sized so the working set
+    stays near *max_block_bytes*. Matches ``frame.rolling(window, min_periods).corr()/.cov()``.
+    """
+    if stat not in _STATS:
+        raise ValueError(f"stat must be one of {_STATS}")
+    mp = window if min_periods is None else min_periods
+    if mp > window:
+        raise ValueError("min_periods must not exceed window")
+    x = frame.to_numpy(dtype=np.float64)
+    # centring keeps the add/subtract updates well conditioned
+    x = x - np.nanmean(x, axis=0)
+    nan = np.isnan(x)
+    m = (~nan).astype(np.float64)
+    x = np.where(nan, 0.0, x)
+    xx2 = np.concatenate([x, x * x], axis=1)
+
+    t_len, n_cols = x.shape
+    block = max(1, int(max_block_bytes // (6 * 8 * n_cols * max(n_cols, window))))
+    for a in range(start, t_len, block):
+        b = min(a + block, t_len)
+        if a >= window - 1 and not nan[a - window + 1:b].any():
+            mats = _complete_block(x, a, b, window, stat)
+        else:
+            mats = _pairwise_block(x, m, xx2, a, b, window, stat, mp)
+        yield frame.index[a:b], mats
+
+
+def rolling_matrices(frame: pd.DataFrame, window: int, *, stat: str = "corr",
+                     min_periods: Optional[int] = None,
+                     dates: Optional[Sequence] = None, max_bytes: int = 2**30) -> np.ndarray:
+    """Stack :func:`iter_rolling` into a ``(len(dates), N, N)`` array (all dates by default).
+
+    Raises ``ValueError`` rather than allocate more than *max_bytes* for the result
+    (``8·len(dates)·N²``); iterate :func:`iter_rolling` or pick fewer *dates* instead.
+    """
+    n_cols = frame.shape[1]
+    n_dates = len(frame) if dates is None else len(dates)
+    if 8 * n_dates * n_cols ** 2 > max_bytes:
+        raise ValueError(f"{n_dates} dates × {n_cols}² matrices need {8 * n_dates * n_cols ** 2 / 2**30:.1f} GB "
+                         f"(max_bytes={max_bytes / 2**30:.1f} GB); stream them with iter_rolling() "
+                         f"or pass dates=")
+    if dates is None:
+        parts = [mats for _, mats in iter_rolling(frame, window, stat=stat, min_periods=min_periods)]
+        return np.concatenate(parts) if parts else np.empty((0, n_cols, n_cols))
+
+    keep = frame.index.get_indexer(pd.DatetimeIndex(dates))
+    if (keep < 0).any():
+        raise KeyError("some dates are not on the frame's calendar")
+    out = np.empty((len(keep), n_cols, n_cols))
+    if not len(keep):
+        return out
+    for idx, mats in iter_rolling(frame, window, stat=stat, min_periods=min_periods,
+                                  start=int(keep.min())):
+        first = frame.index.get_loc(idx[0])
+        hit = (keep >= first) & (keep < first + len(idx))
+        out[hit] = mats[keep[hit] - first]
+    return out
+
+
+def latest(frame: pd.DataFrame, window: int, min_periods: Optional[int] = None
+           ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Correlation and beta matrices for the last date, labelled by column."""
+    names = frame.columns
+    last = frame.index[-1:]
+    corr = rolling_matrices(frame, window, stat="corr", min_periods=min_periods, dates=last)[0]
+    beta = rolling_matrices(frame, window, stat="beta", min_periods=min_periods, dates=last)[0]
+    return pd.DataFrame(corr, names, names), pd.DataFrame(beta, names, names)
+
+
+def top_pairs(matrix: pd.DataFrame, n: int = 20) -> pd.DataFrame:
+    """The *n* off-diagonal pairs with the largest absolute value."""
+    vals = matrix.to_numpy()
+    i, j = np.triu_indices_from(vals, k=1)
+    out = pd.DataFrame({"a": matrix.index[i], "b": matrix.columns[j], "value": vals[i, j]})
+    return out.dropna().reindex(out["value"].abs().sort_values(ascending=False).index).dropna().head(n)
+
+
+def from_warehouse(wh, symbols: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """Aligned levels of chokepoint transit totals, ECB series and daily closing quotes."""
+    series = {}
+    tables = wh.tables()
+    if "chokepoint_transit" in tables:
+        ck = wh.query("chokepoint_transit", columns=["day", "chokepointid", "n_total"])
+        ck["day"] = pd.to_datetime(ck["day"], unit="ms")
+        for cid, grp in ck.groupby("chokepointid"):
+            series[f"chokepoint_{cid}"] = grp.set_index("day")["n_total"].astype(float)
+    if "ecb" in tables:
+        ecb = wh.query("ecb", columns=["date", "series", "value"])
+        for name, grp in ecb.groupby("series", observed=True):
+            series[str(name)] = grp.set_index("date")["value"]
+    if "quotes" in tables:
+        filters = [("symbol", "in", list(symbols))] if symbols else None
+        q = wh.query("quotes", columns=["ts", "symbol", "last"], filters=filters)
+        q["day"] = pd.to_datetime(q["ts"]).dt.normalize()
+        daily = q.sort_values("ts").groupby(["day", "symbol"])["last"].last().unstack()
+        series.update({str(c): daily[c] for c in daily.columns})
+    if not series:
+        raise ValueError(f"nothing to correlate in {wh.root}")
+    return align(series)
+
+
+def main():
+    p = argparse.ArgumentParser(description="Rolling cross-asset correlations from the warehouse.")
+    p.add_argument("--warehouse", default="warehouse")
+    p.add_argument("--window", type=int, default=60, help="rolling window in business days")
+    p.add_argument("--top", type=int, default=20)
+    args = p.parse_args()
+
+    from common.warehouse import Warehouse
+
+    rets = returns(from_warehouse(Warehouse(args.warehouse)))
+    corr, beta = latest(rets, args.window, min_periods=args.window // 2)
+    print(f"Rolling {args.window}-day correlations as of {rets.index[-1]:%Y-%m-%d} "
+          f"({rets.shape[1]} series)")
+    pairs = top_pairs(corr, args.top)
+    pairs["beta_a_on_b"] = [beta.loc[a, b] for a, b in zip(pairs["a"], pairs["b"])]
+    print(pairs.to_string(index=False, float_format=lambda v: f"{v:+.3f}"))
+
+
+if __name__ == "__main__":
+    main()
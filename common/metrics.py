@@ -0,0 +1,219 @@
+"""
+Stage-level timing and metrics for the fetch → parse → render scripts.
+
+Spans record wall time, RSS delta and any ``bytes``/``rows`` you attach, and are exported as
+JSON Lines and/or a Prometheus text endpoint. Nothing is recorded until metrics are switched on,
+either explicitly with :func:`configure` or through the environment:
+
+    METRICS_JSONL=metrics.jsonl      append one JSON object per span
+    METRICS_PORT=9108                serve aggregated counters on http://127.0.0.1:9108/metrics
+
+When disabled, :func:`span` hands back a shared no-op object and :func:`timed` calls straight
+through, so instrumented code pays one attribute lookup and a branch.
+
+Usage
+-----
+```python
+from common import metrics
+
+with metrics.span("portwatch.http", dataset="port_activity", layer=0) as s:
+    r = requests.get(url)
+    s.add(bytes=len(r.content))
+
+@metrics.timed("charts.performance")
+def create_performance_chart(df): ...
+```
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from functools import wraps
+from pathlib import Path
+from typing import Optional
+
+_PAGE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _rss() -> int:
+    """Current resident set size in bytes (0 where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class _State:
+    enabled = False
+    jsonl: Optional[Path] = None
+    server = None  # http.server.ThreadingHTTPServer, imported only when a port is set
+    lock = threading.Lock()
+    # (name, sorted label items) → [count, seconds, bytes, rows, rss_delta]
+    totals: dict = {}
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add(self, **values):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    """One timed stage; use via :func:`span`."""
+
+    __slots__ = ("name", "labels", "values", "_t0", "_rss0")
+
+    def __init__(self, name: str, labels: dict):
+        self.name = name
+        self.labels = labels
+        self.values = {}
+
+    def add(self, **values):
+        """Accumulate numeric values (``bytes``, ``rows``, …) onto the span."""
+        for k, v in values.items():
+            self.values[k] = self.values.get(k, 0) + v
+
+    def __enter__(self):
+        self._rss0 = _rss()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self._t0
+        _record(self.name, self.labels, seconds, _rss() - self._rss0, self.values,
+                error=exc_type.__name__ if exc_type else None)
+        return False
+
+
+def span(name: str, **labels):
+    """Context manager timing the enclosed block as stage *name*."""
+    if not _State.enabled:
+        return _NOOP
+    return Span(name, labels)
+
+
+def timed(name: str, **labels):
+    """Decorator form of :func:`span`; rows are taken from ``len(result)`` when possible."""
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _State.enabled:
+                return fn(*args, **kwargs)
+            with Span(name, labels) as s:
+                result = fn(*args, **kwargs)
+                if hasattr(result, "__len__"):
+                    s.add(rows=len(result))
+                return result
+        return wrapper
+    return deco
+
+
+def _record(name: str, labels: dict, seconds: float, rss_delta: int, values: dict,
+            error: Optional[str] = None):
+    key = (name, tuple(sorted(labels.items())))
+    with _State.lock:
+        t = _State.totals.setdefault(key, [0, 0.0, 0, 0, 0])
+        t[0] += 1
+        t[1] += seconds
+        t[2] += values.get("bytes", 0)
+        t[3] += values.get("rows", 0)
+        t[4] += rss_delta
+        if _State.jsonl is not None:
+            event = {
+                "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+                "span": name,
+                "seconds": round(seconds, 6),
+                "rss_delta": rss_delta,
+                **values,
+                **({"labels": labels} if labels else {}),
+                **({"error": error} if error else {}),
+            }
+            with open(_State.jsonl, "a") as f:
+                f.write(json.dumps(event, default=str) + "\n")
+
+
+def _label_value(value) -> str:
+    """*value* escaped for a Prometheus label (backslash, double quote and newline)."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text() -> str:
+    """Render aggregated span totals in the Prometheus text exposition format.
+
+    ``stage_rss_delta_bytes`` is the net RSS change summed over a stage's spans. Spans can
+    free memory, so it can go down and is a gauge; the other series are counters.
+    """
+    series = (("calls_total", 0, "counter"), ("seconds_total", 1, "counter"),
+              ("bytes_total", 2, "counter"), ("rows_total", 3, "counter"),
+              ("rss_delta_bytes", 4, "gauge"))
+    with _State.lock:
+        totals = {k: list(v) for k, v in _State.totals.items()}
+    lines = []
+    for suffix, i, kind in series:
+        metric = f"stage_{suffix}"
+        lines.append(f"# TYPE {metric} {kind}")
+        for (name, labels), t in sorted(totals.items(), key=lambda kv: (kv[0][0], str(kv[0][1]))):
+            lab = ",".join([f'stage="{_label_value(name)}"'] +
+                           [f'{k}="{_label_value(v)}"' for k, v in labels])
+            lines.append(f"{metric}{{{lab}}} {t[i]}")
+    return "\n".join(lines) + "\n"
+
+
+def _serve(port: int):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") != "/metrics":
+                self.send_error(404)
+                return
+            body = prometheus_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    _State.server = ThreadingHTTPServer(("127.0.0.1", int(port)), Handler)
+    threading.Thread(target=_State.server.serve_forever, daemon=True).start()
+
+
+def configure(jsonl: Optional[str] = None, port: Optional[int] = None):
+    """Enable metrics, exporting to a JSON Lines file and/or a Prometheus endpoint on *port*."""
+    _State.jsonl = Path(jsonl) if jsonl else None
+    if port and _State.server is None:
+        _serve(port)
+    _State.enabled = bool(_State.jsonl or _State.server)
+
+
+def disable():
+    """Stop recording and shut down the Prometheus endpoint (totals are kept)."""
+    _State.enabled = False
+    _State.jsonl = None
+    if _State.server is not None:
+        _State.server.shutdown()
+        _State.server.server_close()
+        _State.server = None
+
+
+def enabled() -> bool:
+    return _State.enabled
+
+
+if os.environ.get("METRICS_JSONL") or os.environ.get("METRICS_PORT"):
+    configure(os.environ.get("METRICS_JSONL"), os.environ.get("METRICS_PORT"))
@@ -0,0 +1,301 @@
+"""
+Local time-series warehouse shared by the quotes, ECB and PortWatch fetchers.
+
+Tables are hive-partitioned Parquet datasets under one root, described by ``catalog.json``
+(partition columns, schema, source, row count, last update). The schema recorded by the first
+write is enforced on later ones: incoming columns are cast to it (safely, so ``10.5`` never
+becomes an int), and data with unknown columns or values that do not fit is rejected. Reads go through pyarrow, so column
+projection and ``filters`` are pushed down: partitions that cannot match are never opened and
+row groups are skipped using Parquet statistics.
+
+Layout::
+
+    <root>/catalog.json
+    <root>/quotes/date=2025-08-01/part-….parquet
+    <root>/ecb/series=mro_rate/part-….parquet
+    <root>/port_activity/year=2025/month=6/part-….parquet
+
+Usage
+-----
+```python
+from common.warehouse import Warehouse
+
+wh = Warehouse("warehouse")
+wh.write("ecb", df_long, partition_by=["series"], mode="overwrite", source="euro_union")
+wh.write("port_activity", june_15_30, partition_by=["year", "month"], mode="merge",
+         key=["portid", "day"])          # keeps June 1–14, replaces the days it brings
+rates = wh.query("ecb", columns=["date", "value"], filters=[("series", "in", ["mro_rate"])])
+```
+
+Frequent small appends (a live quote feed) should go through a :class:`WriteBuffer`, which
+batches them into one file per partition every ``flush_every`` seconds instead of one per call.
+
+Requires ``pyarrow`` (imported on first use).
+"""
+import base64
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence
+
+MODES = ("append", "overwrite", "merge", "replace")
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.dataset
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("the warehouse needs pyarrow: pip install pyarrow") from e
+    return pyarrow
+
+
+class Warehouse:
+    """Partitioned-Parquet store with a JSON catalog and pushdown queries."""
+
+    def __init__(self, root: str = "warehouse"):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._catalog_path = self.root / "catalog.json"
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------ catalog
+
+    def catalog(self) -> dict:
+        if not self._catalog_path.exists():
+            return {}
+        return json.loads(self._catalog_path.read_text())
+
+    def tables(self) -> List[str]:
+        return sorted(self.catalog())
+
+    def _update_catalog(self, table: str, entry: Optional[dict]):
+        cat = self.catalog()
+        if entry is None:
+            cat.pop(table, None)
+        else:
+            cat[table] = entry
+        tmp = self._catalog_path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(cat, indent=2))
+        os.replace(tmp, self._catalog_path)
+
+    # ------------------------------------------------------------------ writes
+
+    def write(self, table: str, df, *, partition_by: Sequence[str] = (),
+              mode: str = "append", source: Optional[str] = None,
+              key: Optional[Sequence[str]] = None) -> int:
+        """Write a DataFrame (or Arrow table) into *table*; returns the number of rows written.
+
+        ``append`` adds files, ``overwrite`` replaces only the partitions present in *df*,
+        ``replace`` drops the whole table first. ``merge`` rewrites the partitions present in
+        *df* with their existing rows plus *df*, keeping the newest row per *key* columns. Use
+        it when *df* covers only part of a partition, e.g. a window starting mid-month.
+        """
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}, got {mode!r}")
+        if mode == "merge" and not key:
+            raise ValueError("mode='merge' needs key= (the columns that identify a row)")
+        pa = _pyarrow()
+        data = df if isinstance(df, pa.Table) else pa.Table.from_pandas(df, preserve_index=False)
+        written = data.num_rows
+        path = self.root / table
+
+        with self._lock:
+            entry = self.catalog().get(table, {})
+            if entry and list(entry.get("partition_by", [])) != list(partition_by):
+                raise ValueError(f"{table} is partitioned by {entry['partition_by']}, "
+                                 f"not {list(partition_by)}")
+            if mode == "replace" or (mode == "overwrite" and not partition_by):
+                shutil.rmtree(path, ignore_errors=True)
+                entry = {}
+            rows = entry.get("rows") if entry else 0
+            if rows is None:                      # catalogs written before rows were tracked
+                rows = self._count(path)
+            if entry:
+                data = self._conform(table, data, self._schema(table, entry))
+            if entry and mode in ("overwrite", "merge"):
+                touched = self._partition_filter(data, partition_by)
+                if mode == "merge":
+                    old = self.dataset(table).to_table(filter=touched)
+                    rows -= old.num_rows
+                    data = self._merged(data, old, key)
+                else:
+                    rows -= self.dataset(table).count_rows(filter=touched)
+
+            pa.dataset.write_dataset(
+                data, path, format="parquet",
+                partitioning=list(partition_by) or None, partitioning_flavor="hive",
+                basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+                existing_data_behavior=("delete_matching" if mode in ("overwrite", "merge")
+                                        else "overwrite_or_ignore"),
+            )
+
+            self._update_catalog(table, {
+                "partition_by": list(partition_by),
+                "columns": {f.name: str(f.type) for f in data.schema},
+                "schema": base64.b64encode(data.schema.remove_metadata().serialize().to_pybytes()).decode(),
+                "source": source or entry.get("source"),
+                "rows": rows + data.num_rows,
+                "updated": datetime.now().isoformat(timespec="seconds"),
+            })
+        return written
+
+    def _schema(self, table: str, entry: dict):
+        """The Arrow schema recorded for *table* (read from its files for older catalogs)."""
+        pa = _pyarrow()
+        if "schema" in entry:
+            return pa.ipc.read_schema(pa.py_buffer(base64.b64decode(entry["schema"])))
+        return self.dataset(table).schema.remove_metadata()
+
+    @staticmethod
+    def _conform(table: str, data, schema):
+        """*data* cast to *schema*; missing columns become nulls, anything else that differs is an error."""
+        pa = _pyarrow()
+        extra = [n for n in data.schema.names if schema.get_field_index(n) < 0]
+        if extra:
+            raise ValueError(f"{table}: columns {extra} are not in the stored schema "
+                             f"({', '.join(schema.names)})")
+        columns = [data.column(f.name) if f.name in data.schema.names else pa.nulls(data.num_rows, f.type)
+                   for f in schema]
+        try:
+            return pa.Table.from_arrays(columns, names=schema.names).cast(schema)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError) as e:
+            raise ValueError(f"{table}: data does not fit the stored schema: {e}") from e
+
+    @staticmethod
+    def _partition_filter(data, partition_by: Sequence[str]):
+        """Expression matching the partitions *data* writes to (``None``: the whole table)."""
+        pa = _pyarrow()
+        if not partition_by:
+            return None
+        expr = None
+        for combo in data.select(list(partition_by)).to_pandas().drop_duplicates().itertuples(index=False):
+            match = None
+            for col, value in zip(partition_by, combo):
+                term = pa.dataset.field(col) == value
+                match = term if match is None else match & term
+            expr = match if expr is None else expr | match
+        return expr
+
+    @staticmethod
+    def _merged(data, old, key: Sequence[str]):
+        """*old* rows updated with *data*, keeping the newest row per *key*."""
+        pa = _pyarrow()
+        import pandas as pd
+
+        if old.num_rows == 0:
+            return data
+        merged = (pd.concat([old.to_pandas(), data.to_pandas()], ignore_index=True)
+                  .drop_duplicates(list(key), keep="last"))
+        return pa.Table.from_pandas(merged[data.schema.names], schema=data.schema, preserve_index=False)
+
+    @staticmethod
+    def _count(path: Path) -> int:
+        """Rows in every file of *path*; only used to seed catalogs that predate the running count."""
+        pa = _pyarrow()
+        return sum(pa.parquet.ParquetFile(f).metadata.num_rows for f in path.rglob("*.parquet"))
+
+    def drop(self, table: str):
+        with self._lock:
+            shutil.rmtree(self.root / table, ignore_errors=True)
+            self._update_catalog(table, None)
+
+    # ------------------------------------------------------------------ reads
+
+    def dataset(self, table: str):
+        """The underlying ``pyarrow.dataset.Dataset`` for *table*."""
+        if table not in self.catalog():
+            raise KeyError(f"no table {table!r} in {self.root} (have: {', '.join(self.tables())})")
+        pa = _pyarrow()
+        return pa.dataset.dataset(self.root / table, format="parquet", partitioning="hive")
+
+    @staticmethod
+    def _expression(filters):
+        """Turn ``[(col, op, value), …]`` (ANDed) into a dataset expression."""
+        if not filters:
+            return None
+        pa = _pyarrow()
+        return pa.parquet.filters_to_expression(list(filters))
+
+    def query(self, table: str, columns: Optional[Sequence[str]] = None,
+              filters: Optional[Sequence[tuple]] = None, *, arrow: bool = False):
+        """Read *columns* of *table* matching *filters*, e.g. ``[("year", ">=", 2025)]``.
+
+        Returns a pandas DataFrame (or an Arrow table with ``arrow=True``).
+        """
+        tbl = self.dataset(table).to_table(columns=list(columns) if columns else None,
+                                           filter=self._expression(filters))
+        return tbl if arrow else tbl.to_pandas()
+
+    def scan(self, table: str, columns: Optional[Sequence[str]] = None,
+             filters: Optional[Sequence[tuple]] = None, *,
+             batch_size: int = 131_072) -> Iterator:
+        """Stream matching rows as Arrow record batches without materialising the table."""
+        return self.dataset(table).to_batches(columns=list(columns) if columns else None,
+                                              filter=self._expression(filters),
+                                              batch_size=batch_size)
+
+
+class WriteBuffer:
+    """Stand-in for :meth:`Warehouse.write` that collects appends and writes them in batches.
+
+    Frames are held per (table, write options) and written together once ``flush_every``
+    seconds have passed since the last flush or ``max_rows`` rows are waiting, and on
+    :meth:`flush`. Call :meth:`flush` at shutdown; rows still buffered are otherwise lost.
+    """
+
+    def __init__(self, warehouse: Warehouse, flush_every: float = 60.0, max_rows: int = 100_000):
+        self.warehouse = warehouse
+        self.flush_every = flush_every
+        self.max_rows = max_rows
+        self._pending = {}                                  # (table, options) -> [frames]
+        self._rows = 0
+        self._flushed = time.monotonic()
+        self._lock = threading.Lock()
+
+    def write(self, table: str, df, *, partition_by: Sequence[str] = (),
+              mode: str = "append", source: Optional[str] = None, **kw) -> int:
+        """Buffer *df* for *table*; anything but ``mode="append"`` flushes and writes through."""
+        if mode != "append":
+            self.flush()
+            return self.warehouse.write(table, df, partition_by=partition_by, mode=mode,
+                                        source=source, **kw)
+        with self._lock:
+            self._pending.setdefault((table, tuple(partition_by), source), []).append(df)
+            self._rows += len(df)
+            due = (self._rows >= self.max_rows
+                   or time.monotonic() - self._flushed >= self.flush_every)
+        if due:
+            self.flush()
+        return len(df)
+
+    def flush(self) -> int:
+        """Write everything buffered; returns the number of rows written.
+
+        Batches are taken out of the buffer before they are written, so one the warehouse
+        rejects is raised once rather than retried on every later flush.
+        """
+        import pandas as pd
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._rows = 0
+            self._flushed = time.monotonic()
+        written = 0
+        for (table, partition_by, source), frames in pending.items():
+            data = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+            written += self.warehouse.write(table, data, partition_by=partition_by, source=source)
+        return written
+
+
+def default() -> Optional[Warehouse]:
+    """The warehouse at ``$WAREHOUSE_DIR``, or ``None`` when that is unset."""
+    root = os.getenv("WAREHOUSE_DIR")
+    return Warehouse(root) if root else None
@@ -20,7 +20,21 @@ Usage
 -----
 ```bash
 $ pip install pandas requests
-$ python portwatch_fetch.py                # dumps four CSVs in the current dir
+$ python portwatch_fetch.py                # dumps four CSVs (last 365 days) in the current dir:
+#   port_activity_last_year.csv, chokepoint_transit_last_year.csv,
+#   ports_metadata.csv, chokepoints_metadata.csv
+# Any other window names the daily layers by date instead, e.g. port_activity_2024-01-01_2024-12-31.csv
+
+# All four layers are fetched concurrently; tune the shared request budget & selection:
+$ python portwatch_fetch.py --start 2024-01-01 --end 2024-12-31 \
+      --datasets port_activity chokepoint_daily --format parquet --max-inflight 6
+
+# Flag unusual transit / port-call days; detector state persists between runs (see anomaly.py):
+$ python portwatch_fetch.py --days 30 --datasets chokepoint_daily --anomaly-state state/
+
+# Multi-year port activity for every port: fetch month by month and aggregate out of core
+$ python rollup.py --warehouse warehouse ingest --start 2019-01-01
+$ python rollup.py --warehouse warehouse rollup --by country month --quantiles 0.5 0.9
 
 # Custom date range & filter examples:
 $ python - <<'PY'
@@ -30,14 +44,22 @@ print(get_port_activity('2024-07-01', '2025-06-30', port_ids=[655,658,660]).head
 PY
 ```
 """
+import argparse as _argparse
 import datetime as _dt
+import math as _math
+import os as _os
+import threading as _threading
+import time as _time
+from concurrent.futures import ThreadPoolExecutor as _Pool, as_completed as _as_completed
 from pathlib import Path as _P
-from typing import List, Optional
+from typing import Callable, List, Optional
 
 import pandas as _pd
 import requests as _r
 
-_ARCGIS_PORTAL = "https://www.arcgis.com"
+from common import metrics as _metrics
+
+_ARCGIS_PORTAL = _os.environ.get("ARCGIS_PORTAL", "https://www.arcgis.com")
 
 _DATASETS = {
     "port_activity": "959214444157458aad969389b3ebe1a0",   # Daily Port Activity Data
@@ -46,13 +68,26 @@ _DATASETS = {
     "chokepoints_meta": "fa9a5800b0ee4855af8b2944ab1e07af"   # Chokepoints reference layer
 }
 
+# Caps the number of HTTP requests in flight across *all* datasets; set by the CLI.
+_INFLIGHT: Optional[_threading.BoundedSemaphore] = None
+# Shared pool the pages of every dataset are fetched on (see _query); set by the CLI.
+_PAGES: Optional[_Pool] = None
+
 ###############################################################################
 # Low-level helpers                                                            #
 ###############################################################################
 
+def _get(url: str, **kw) -> _r.Response:
+    """``requests.get`` that waits for a slot in the shared in-flight budget (if any)."""
+    if _INFLIGHT is None:
+        return _r.get(url, **kw)
+    with _INFLIGHT:
+        return _r.get(url, **kw)
+
+
 def _item_info(item_id: str) -> dict:
     """Return the ArcGIS item metadata as a JSON dict."""
-    resp = _r.get(f"{_ARCGIS_PORTAL}/sharing/rest/content/items/{item_id}", params={"f": "json"})
+    resp = _get(f"{_ARCGIS_PORTAL}/sharing/rest/content/items/{item_id}", params={"f": "json"})
     resp.raise_for_status()
     return resp.json()
 
@@ -65,37 +100,100 @@ def _service_url(item_id: str) -> str:
     return meta["url"].rstrip("/")  # e.g. …/FeatureServer
 
 
+def _count(service_url: str, layer: int = 0, where: str = "1=1", *,
+           token: Optional[str] = None) -> int:
+    """Return the number of rows that satisfy *where* (one cheap ``returnCountOnly`` call)."""
+    params = {"where": where, "returnCountOnly": "true", "f": "json"}
+    if token:
+        params["token"] = token
+    r = _get(f"{service_url}/{layer}/query", params=params, timeout=120)
+    r.raise_for_status()
+    j = r.json()
+    if "error" in j:
+        raise RuntimeError(j["error"])
+    return int(j.get("count", 0))
+
+
+def _page(endpoint: str, params: dict, labels: dict) -> List[dict]:
+    """One page of feature attributes (a single request, gated by the in-flight budget)."""
+    with _metrics.span("portwatch.http", **labels) as s:
+        r = _get(endpoint, params=params, timeout=120)
+        r.raise_for_status()
+        s.add(bytes=len(r.content))
+    with _metrics.span("portwatch.decode", **labels) as s:
+        j = r.json()
+        if "error" in j:
+            raise RuntimeError(j["error"])
+        batch = [ft["attributes"] for ft in j.get("features", [])]
+        s.add(rows=len(batch))
+    return batch
+
+
 def _query(service_url: str, layer: int = 0, where: str = "1=1", *,
            out_fields: str = "*", batch_size: int = 2000,
-           token: Optional[str] = None) -> _pd.DataFrame:
-    """Download *all* rows that satisfy *where* from a FeatureServer layer."""
+           token: Optional[str] = None, dataset: Optional[str] = None,
+           progress: Optional[Callable[[int, int], None]] = None) -> _pd.DataFrame:
+    """Download *all* rows that satisfy *where* from a FeatureServer layer.
+
+    *dataset* labels the metrics spans (default: the service name in *service_url*).
+
+    With a shared page pool (:data:`_PAGES`, set by the CLI) the row count is fetched first and
+    every page offset is submitted to the pool at once, so pages of all datasets interleave and
+    only the in-flight budget limits concurrency. Without one, pages are fetched in turn. Either
+    way, pages are read on past the counted ones until a short page, in case rows were added.
+
+    If *progress* is given it is first called as ``progress(0, total_pages)`` and then as
+    ``progress(rows_in_page, pages_remaining)`` after every page.
+    """
     endpoint = f"{service_url}/{layer}/query"
     params = {
         "where": where,
         "outFields": out_fields,
         "returnGeometry": "false",
         "f": "json",
-        "resultOffset": 0,
         "resultRecordCount": batch_size,
     }
     if token:
         params["token"] = token
-
-    records = []
-    while True:
-        r = _r.get(endpoint, params=params, timeout=120)
-        r.raise_for_status()
-        j = r.json()
-        if "error" in j:
-            raise RuntimeError(j["error"])
-        batch = [ft["attributes"] for ft in j.get("features", [])]
-        if not batch:
-            break
+    labels = {"dataset": dataset or service_url.rstrip("/").split("/")[-2], "layer": layer}
+
+    pages_left = 0
+    if progress is not None or _PAGES is not None:
+        pages_left = _math.ceil(_count(service_url, layer, where, token=token) / batch_size)
+        if progress is not None:
+            progress(0, pages_left)
+
+    records, offset = [], 0
+    if _PAGES is not None and pages_left:
+        futures = {_PAGES.submit(_page, endpoint, {**params, "resultOffset": i * batch_size}, labels): i
+                   for i in range(pages_left)}
+        pages = [None] * len(futures)
+        try:
+            for fut in _as_completed(futures):
+                pages[futures[fut]] = fut.result()
+                pages_left -= 1
+                if progress is not None:
+                    progress(len(pages[futures[fut]]), pages_left)
+        except BaseException:
+            for fut in futures:
+                fut.cancel()
+            raise
+        records = [row for page in pages for row in page]
+        offset = None if len(pages[-1]) < batch_size else len(pages) * batch_size
+
+    while offset is not None:
+        batch = _page(endpoint, {**params, "resultOffset": offset}, labels)
+        if progress is not None:
+            pages_left = max(pages_left - 1, 0)
+            progress(len(batch), pages_left)
         records.extend(batch)
         if len(batch) < batch_size:
             break
-        params["resultOffset"] += batch_size
-    return _pd.DataFrame.from_records(records)
+        offset += batch_size
+    with _metrics.span("portwatch.dataframe", **labels) as s:
+        df = _pd.DataFrame.from_records(records)
+        s.add(rows=len(df))
+    return df
 
 ###############################################################################
 # (w)Rappers                                                  #
@@ -103,7 +201,7 @@ def _query(service_url: str, layer: int = 0, where: str = "1=1", *,
 
 def get_port_activity(start_date: str, end_date: str, *,
                       port_ids: Optional[List[int]] = None,
-                      include_estimates: bool = True) -> _pd.DataFrame:
+                      include_estimates: bool = True, **query_kw) -> _pd.DataFrame:
     """Return Daily Port Activity rows between *start_date* and *end_date* (YYYY-MM-DD)."""
     service = _service_url(_DATASETS["port_activity"])
     where = f"day >= DATE '{start_date}' AND day <= DATE '{end_date}'"
@@ -111,54 +209,221 @@ def get_port_activity(start_date: str, end_date: str, *,
         where += f" AND portid IN ({','.join(map(str, port_ids))})"
     if not include_estimates:
         where += " AND (export_tons IS NOT NULL OR import_tons IS NOT NULL)"
-    return _query(service, where=where)
+    return _query(service, where=where, dataset="port_activity", **query_kw)
 
 
 def get_chokepoint_transit(start_date: str, end_date: str, *,
-                           chokepoint_ids: Optional[List[int]] = None) -> _pd.DataFrame:
+                           chokepoint_ids: Optional[List[int]] = None,
+                           **query_kw) -> _pd.DataFrame:
     service = _service_url(_DATASETS["chokepoint_daily"])
     where = f"day >= DATE '{start_date}' AND day <= DATE '{end_date}'"
     if chokepoint_ids:
         where += f" AND chokepointid IN ({','.join(map(str, chokepoint_ids))})"
-    return _query(service, where=where)
+    return _query(service, where=where, dataset="chokepoint_daily", **query_kw)
 
 
-def get_ports_metadata(*, relevant_only: bool = True) -> _pd.DataFrame:
+def get_ports_metadata(*, relevant_only: bool = True, **query_kw) -> _pd.DataFrame:
     service = _service_url(_DATASETS["ports_meta"])
     where = "is_relevant = 1" if relevant_only else "1=1"
-    return _query(service, where=where)
+    return _query(service, where=where, dataset="ports_meta", **query_kw)
 
 
-def get_chokepoints_metadata() -> _pd.DataFrame:
+def get_chokepoints_metadata(**query_kw) -> _pd.DataFrame:
     service = _service_url(_DATASETS["chokepoints_meta"])
-    return _query(service, where="1=1")
+    return _query(service, where="1=1", dataset="chokepoints_meta", **query_kw)
 
 ###############################################################################
 # Simple CLI                                               
 ###############################################################################
 
-def _dump_csv(df: _pd.DataFrame, filename: str):
-    fp = _P(filename)
-    df.to_csv(fp, index=False)
-    print(f"[✓] wrote {len(df):,} rows → {fp.resolve()}")
+# dataset key → (label, output stem, takes a date range?)
+_CLI_DATASETS = {
+    "port_activity": ("Daily Port Activity", "port_activity", True),
+    "chokepoint_daily": ("Daily Chokepoint Transit", "chokepoint_transit", True),
+    "ports_meta": ("Ports metadata", "ports_metadata", False),
+    "chokepoints_meta": ("Chokepoints metadata", "chokepoints_metadata", False),
+}
+
+_FORMATS = ("csv", "parquet", "json")
+
+_print_lock = _threading.Lock()
+
+
+def _say(msg: str):
+    with _print_lock:
+        print(msg, flush=True)
+
 
+class _Progress:
+    """Per-dataset progress callback for :func:`_query` (rows, rows/s, pages remaining)."""
 
-def main():
-    today = _dt.date.today()
-    start = (today - _dt.timedelta(days=365)).isoformat()
-    end = today.isoformat()
+    def __init__(self, label: str):
+        self.label = label
+        self.rows = 0
+        self.started = False
+        self.t0 = _time.perf_counter()
 
-    print("Fetching Daily Port Activity …")
-    _dump_csv(get_port_activity(start, end), "port_activity_last_year.csv")
+    def __call__(self, rows: int, pages_left: int):
+        if not self.started:
+            self.started = True
+            _say(f"[…] {self.label}: {pages_left} page(s) to fetch")
+            return
+        self.rows += rows
+        rate = self.rows / max(_time.perf_counter() - self.t0, 1e-9)
+        _say(f"[…] {self.label}: {self.rows:,} rows ({rate:,.0f} rows/s), "
+             f"{pages_left} page(s) remaining")
 
-    print("Fetching Daily Chokepoint Transit …")
-    _dump_csv(get_chokepoint_transit(start, end), "chokepoint_transit_last_year.csv")
 
-    print("Fetching Ports metadata …")
-    _dump_csv(get_ports_metadata(), "ports_metadata.csv")
+def _dump(df: _pd.DataFrame, stem: str, fmt: str = "csv", out_dir: str = "."):
+    fp = _P(out_dir) / f"{stem}.{fmt}"
+    fp.parent.mkdir(parents=True, exist_ok=True)
+    if fmt == "parquet":
+        df.to_parquet(fp, index=False)
+    elif fmt == "json":
+        df.to_json(fp, orient="records", lines=True, date_format="iso")
+    else:
+        df.to_csv(fp, index=False)
+    _say(f"[✓] wrote {len(df):,} rows → {fp.resolve()}")
+
+
+# warehouse table → columns identifying one daily row
+_TABLE_KEYS = {
+    "port_activity": ["portid", "day"],
+    "chokepoint_transit": ["chokepointid", "day"],
+}
+
 
-    print("Fetching Chokepoints metadata …")
-    _dump_csv(get_chokepoints_metadata(), "chokepoints_metadata.csv")
+def store_window(wh, table: str, df: _pd.DataFrame, start: str, end: str) -> int:
+    """Store daily rows fetched for *start*..*end* (YYYY-MM-DD) in *table*'s year/month partitions.
+
+    Months the window covers completely are replaced. The partial months at either end are
+    merged with the stored rows and deduplicated on the table's natural key (id + day), so the
+    days of those months outside the window are kept. Returns the number of rows written.
+    """
+    if df.empty:
+        return 0
+    if "year" not in df.columns or "month" not in df.columns:
+        day = _pd.to_datetime(df["day"], unit="ms") if "day" in df.columns else _pd.to_datetime(df["date"])
+        df = df.assign(year=day.dt.year, month=day.dt.month)
+    # months counted as year * 12 + month; the window fully covers first_full..last_full
+    first, last = _dt.date.fromisoformat(start), _dt.date.fromisoformat(end)
+    first_full = first.year * 12 + first.month + (first.day > 1)
+    last_full = last.year * 12 + last.month - ((last + _dt.timedelta(days=1)).day != 1)
+    months = df["year"].astype(int) * 12 + df["month"].astype(int)
+    full = (months >= first_full) & (months <= last_full)
+
+    n = 0
+    if full.any():
+        n += wh.write(table, df[full], partition_by=["year", "month"], mode="overwrite",
+                      source="portwatch_imf")
+    if not full.all():
+        n += wh.write(table, df[~full], partition_by=["year", "month"], mode="merge",
+                      key=_TABLE_KEYS[table], source="portwatch_imf")
+    return n
+
+
+def _store(wh, df: _pd.DataFrame, table: str, ranged: bool, start: str, end: str):
+    """Write one dataset to the warehouse: daily layers by year/month, metadata wholesale."""
+    if not ranged:
+        n = wh.write(table, df, mode="replace", source="portwatch_imf")
+    else:
+        n = store_window(wh, table, df, start, end)
+    _say(f"[✓] stored {n:,} rows → {wh.root / table}")
+
+
+def _detect(state_dir: str, key: str, df: _pd.DataFrame, table: str, window: str,
+            fmt: str, out_dir: str):
+    """Fold a daily layer into its saved anomaly detector and report the days it flags."""
+    from anomaly import detector_for
+
+    det = detector_for(key, state_dir)
+    if det is None:
+        return
+    flags = det.update(df)
+    det.save(_P(state_dir) / f"{key}.npz")
+    for r in flags.itertuples(index=False):
+        name = getattr(r, "portname", None) or getattr(r, det.id_col)
+        _say(f"[!] {r.day:%Y-%m-%d} {name}: {r.column} {r.value:,.0f} "
+             f"(expected {r.expected:,.0f}, z={r.z:+.1f})")
+    if not flags.empty:
+        _dump(flags, f"{table}_anomalies_{window}", fmt, out_dir)
+
+
+def _fetch_dataset(key: str, start: str, end: str, progress: _Progress) -> _pd.DataFrame:
+    if key == "port_activity":
+        return get_port_activity(start, end, progress=progress)
+    if key == "chokepoint_daily":
+        return get_chokepoint_transit(start, end, progress=progress)
+    if key == "ports_meta":
+        return get_ports_metadata(progress=progress)
+    return get_chokepoints_metadata(progress=progress)
+
+
+def _parse_args(argv: Optional[List[str]] = None) -> _argparse.Namespace:
+    p = _argparse.ArgumentParser(description="Download PortWatch layers concurrently.")
+    p.add_argument("--start", help="first day (YYYY-MM-DD); default: END minus --days")
+    p.add_argument("--end", help="last day (YYYY-MM-DD); default: today")
+    p.add_argument("--days", type=int, default=365,
+                   help="window length when --start is omitted (default: 365)")
+    p.add_argument("--datasets", nargs="+", choices=list(_CLI_DATASETS),
+                   default=list(_CLI_DATASETS), help="layers to fetch (default: all)")
+    p.add_argument("--format", choices=_FORMATS, default="csv", help="output format")
+    p.add_argument("--out-dir", default=".", help="output directory")
+    p.add_argument("--max-inflight", type=int, default=4,
+                   help="max HTTP requests in flight across all datasets (default: 4)")
+    p.add_argument("--warehouse", default=_os.environ.get("WAREHOUSE_DIR"),
+                   help="also store results in this warehouse (default: $WAREHOUSE_DIR)")
+    p.add_argument("--anomaly-state", default=_os.environ.get("ANOMALY_STATE_DIR"),
+                   help="flag unusual days in the daily layers, keeping detector state in this "
+                        "directory (default: $ANOMALY_STATE_DIR)")
+    return p.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    global _INFLIGHT, _PAGES
+    args = _parse_args(argv)
+
+    end = args.end or _dt.date.today().isoformat()
+    start = args.start or (_dt.date.fromisoformat(end) - _dt.timedelta(days=args.days)).isoformat()
+    # the default run keeps the original ``*_last_year`` file names
+    window = "last_year" if not (args.start or args.end) and args.days == 365 else f"{start}_{end}"
+    _INFLIGHT = _threading.BoundedSemaphore(max(args.max_inflight, 1))
+    _PAGES = _Pool(max_workers=max(args.max_inflight, 1), thread_name_prefix="portwatch-page")
+
+    wh = None
+    if args.warehouse:
+        from common.warehouse import Warehouse
+        wh = Warehouse(args.warehouse)
+
+    failed = []
+    try:
+        with _Pool(max_workers=len(args.datasets)) as pool:
+            futures = {}
+            for key in args.datasets:
+                label, table, ranged = _CLI_DATASETS[key]
+                stem = f"{table}_{window}" if ranged else table
+                _say(f"Fetching {label} …")
+                fut = pool.submit(_fetch_dataset, key, start, end, _Progress(label))
+                futures[fut] = (key, label, stem, table, ranged)
+
+            for fut in _as_completed(futures):
+                key, label, stem, table, ranged = futures[fut]
+                try:
+                    df = fut.result()
+                    _dump(df, stem, args.format, args.out_dir)
+                    if wh is not None:
+                        _store(wh, df, table, ranged, start, end)
+                    if args.anomaly_state and ranged:
+                        _detect(args.anomaly_state, key, df, table, window, args.format, args.out_dir)
+                except Exception as e:
+                    _say(f"[✗] {label}: {e}")
+                    failed.append(label)
+    finally:
+        _PAGES.shutdown(cancel_futures=True)
+        _PAGES = None
+
+    if failed:
+        raise SystemExit(f"failed: {', '.join(failed)}")
 
 
 if __name__ == "__main__":
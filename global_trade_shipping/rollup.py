@@ -0,0 +1,489 @@
+#!/usr/bin/env python3
+"""
+Out-of-core rollups of multi-year PortWatch port activity.
+
+A multi-year ``get_port_activity`` pull over every port is too large to hold as one DataFrame,
+so the work is split in two steps:
+
+* :func:`ingest` fetches the layer one calendar month at a time (a few months in parallel) and
+  writes each month straight into the warehouse's ``port_activity/year=…/month=…`` partitions
+  (through :func:`portwatch_imf.store_window`).
+* :func:`rollup` aggregates that table in worker processes, one partition file at a time, read
+  in record batches sized to ``max_bytes``.
+
+``count``, ``sum``, ``mean``, ``min`` and ``max`` are reduced to small per-group partials in the
+workers and merged at the end. Quantiles need every value of a group, so rows are first
+hash-partitioned on the group key into spill files under a temporary directory. There are
+enough buckets that one bucket fits in a worker's share of ``max_bytes``. Each bucket then holds
+whole groups and is aggregated exactly with pandas.
+
+Limit: a group cannot be split across buckets. With a low-cardinality key (``--by region``
+has a handful of groups) a bucket can exceed its share. Such a bucket computes the quantiles
+one value column at a time, but a group's values for one column must still fit in memory. A
+warning is printed when they do not; raise ``--memory-mb`` or add a period key to split them.
+
+Groups are any mix of ``port`` (portid), ``country``, ``region`` (the port's continent, from the
+``ports_metadata`` table) and one period, ``week`` (starting Monday) or ``month``.
+:func:`rollup_frame` computes the same result in memory; both paths return the same frame.
+``rollup.py check`` verifies that on a synthetic warehouse.
+
+Usage
+-----
+```bash
+$ python rollup.py --warehouse warehouse ingest --start 2019-01-01 --end 2025-06-30
+$ python rollup.py --warehouse warehouse rollup --by region month --quantiles 0.5 0.9 \\
+      --memory-mb 512 --jobs 4 --out region_monthly.csv
+$ python rollup.py check                  # rollup() == rollup_frame() on synthetic data
+```
+"""
+import argparse
+import datetime as dt
+import math
+import os
+import shutil
+import tempfile
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+TABLE = "port_activity"
+VALUES = ["portcalls", "import", "export"]
+STATS = ("count", "sum", "mean", "min", "max")
+PERIODS = ("week", "month")
+# group name → column of port_activity it is read from
+KEYS = {"port": "portid", "country": "country", "region": "portid"}
+
+_DAY_MS = 86_400_000
+_ROW_OVERHEAD = 4       # pandas groupby working set relative to the raw column bytes
+
+
+###############################################################################
+# Ingest                                                                       #
+###############################################################################
+
+def _months(start: str, end: str):
+    """``(first, last)`` day pairs covering *start*..*end*, split at calendar months."""
+    a, b = dt.date.fromisoformat(start), dt.date.fromisoformat(end)
+    while a <= b:
+        nxt = (a.replace(day=1) + dt.timedelta(days=32)).replace(day=1)
+        yield a.isoformat(), min(nxt - dt.timedelta(days=1), b).isoformat()
+        a = nxt
+
+
+def ingest(wh, start: str, end: str, *, jobs: int = 4, **query_kw) -> int:
+    """Fetch port activity month by month into *wh*; returns the number of rows stored.
+
+    Only ``jobs`` months are in memory at once. A month the window covers completely replaces
+    its partition; the partial months at either end are merged into theirs, keeping the
+    stored days outside the window. Re-running over an overlapping window therefore neither
+    duplicates nor drops rows.
+    """
+    import portwatch_imf
+
+    def one(first, last):
+        df = portwatch_imf.get_port_activity(first, last, **query_kw)
+        return portwatch_imf.store_window(wh, TABLE, df, first, last)
+
+    rows = 0
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as pool:
+        futures = {pool.submit(one, a, b): a[:7] for a, b in _months(start, end)}
+        for fut in as_completed(futures):
+            n = fut.result()
+            rows += n
+            print(f"[✓] {futures[fut]}: {n:,} rows → {wh.root / TABLE}", flush=True)
+    return rows
+
+
+###############################################################################
+# Group keys and the in-memory aggregation                                     #
+###############################################################################
+
+def _check(by: Sequence[str], stats: Sequence[str]):
+    unknown = [k for k in by if k not in KEYS and k not in PERIODS]
+    if unknown:
+        raise ValueError(f"unknown group keys {unknown}; use {list(KEYS) + list(PERIODS)}")
+    if sum(k in PERIODS for k in by) > 1:
+        raise ValueError("group by at most one of week / month")
+    bad = [s for s in stats if s not in STATS]
+    if bad:
+        raise ValueError(f"unknown stats {bad}; use {list(STATS)}")
+
+
+def _quantile_name(q: float) -> str:
+    return f"p{q * 100:g}"
+
+
+def _columns(by: Sequence[str]) -> List[str]:
+    """Source columns needed to build the keys in *by*."""
+    cols = [KEYS[k] for k in by if k in KEYS]
+    if any(k in PERIODS for k in by):
+        cols.append("day")
+    return list(dict.fromkeys(cols))
+
+
+def _keyed(df: pd.DataFrame, by: Sequence[str], values: Sequence[str],
+           regions: Optional[pd.Series]) -> pd.DataFrame:
+    """The key columns named as in *by*, followed by *values*."""
+    out = {}
+    for k in by:
+        if k == "port":
+            out[k] = df["portid"]
+        elif k == "country":
+            out[k] = df["country"]
+        elif k == "region":
+            out[k] = df["portid"].map(regions)
+        else:
+            days = (df["day"].to_numpy(dtype=np.int64) // _DAY_MS).astype("datetime64[D]")
+            if k == "week":
+                # 1970-01-01 was a Thursday: shift back to that week's Monday
+                days = days - (days.astype(np.int64) + 3) % 7
+            else:
+                days = days.astype("datetime64[M]").astype("datetime64[D]")
+            out[k] = days.astype("datetime64[ns]")
+    for v in values:
+        out[v] = df[v].astype(np.float64) if v in df.columns else np.nan
+    return pd.DataFrame(out, index=df.index)
+
+
+def _aggregate(keyed: pd.DataFrame, by: Sequence[str], values: Sequence[str],
+               stats: Sequence[str], quantiles: Sequence[float]) -> pd.DataFrame:
+    g = keyed.groupby(list(by), sort=True)[list(values)]
+    parts = {s: getattr(g, s)() for s in stats}
+    parts.update({_quantile_name(q): g.quantile(q) for q in quantiles})
+    cols = {f"{v}_{name}": part[v] for v in values for name, part in parts.items()}
+    return pd.DataFrame(cols)
+
+
+def rollup_frame(df: pd.DataFrame, by: Sequence[str] = ("country",), values: Sequence[str] = VALUES,
+                 stats: Sequence[str] = ("sum", "mean"), quantiles: Sequence[float] = (), *,
+                 regions: Optional[pd.Series] = None) -> pd.DataFrame:
+    """In-memory rollup of a port-activity frame; same arguments and result as :func:`rollup`."""
+    _check(by, stats)
+    if "region" in by and regions is None:
+        raise ValueError("grouping by region needs regions= (portid → continent)")
+    return _aggregate(_keyed(df, by, values, regions), by, values, stats, quantiles)
+
+
+def regions(wh) -> pd.Series:
+    """portid → continent from the warehouse's ``ports_metadata`` table."""
+    if "ports_metadata" not in wh.tables():
+        raise KeyError("grouping by region needs the ports_metadata table; "
+                       "run portwatch_imf.py --datasets ports_meta --warehouse …")
+    meta = wh.query("ports_metadata", columns=["portid", "continent"])
+    return meta.drop_duplicates("portid").set_index("portid")["continent"]
+
+
+###############################################################################
+# Out-of-core aggregation                                                      #
+###############################################################################
+
+def _batches(path: str, columns: List[str], batch_rows: int, day_range):
+    """Record batches of one Parquet file as DataFrames, restricted to *day_range* (ms)."""
+    import pyarrow.parquet as pq
+
+    pf = pq.ParquetFile(path)
+    have = set(pf.schema_arrow.names)
+    columns = list(dict.fromkeys(columns + (["day"] if day_range is not None else [])))
+    for batch in pf.iter_batches(batch_size=batch_rows, columns=[c for c in columns if c in have]):
+        df = batch.to_pandas()
+        if day_range is not None:
+            df = df[(df["day"] >= day_range[0]) & (df["day"] <= day_range[1])]
+        if not df.empty:
+            yield df
+
+
+def _partials(path, by, values, regions, batch_rows, day_range) -> Optional[pd.DataFrame]:
+    """Worker: per-group count, sum, min and max of one partition file."""
+    parts = []
+    for df in _batches(path, _columns(by) + list(values), batch_rows, day_range):
+        g = _keyed(df, by, values, regions).groupby(list(by), sort=False)[list(values)]
+        parts.append(pd.concat({"count": g.count(), "sum": g.sum(), "min": g.min(), "max": g.max()},
+                               axis=1))
+    return _merge(parts, by) if parts else None
+
+
+def _merge(parts: List[pd.DataFrame], by) -> pd.DataFrame:
+    """Combine partials that may share groups."""
+    whole = pd.concat(parts)
+    if len(parts) == 1:
+        return whole
+    levels = list(range(len(by)))
+    merged = {s: getattr(whole[s].groupby(level=levels, sort=False), op)()
+              for s, op in (("count", "sum"), ("sum", "sum"), ("min", "min"), ("max", "max"))}
+    return pd.concat(merged, axis=1)
+
+
+def _finish(partial: pd.DataFrame, values, stats) -> pd.DataFrame:
+    cols = {}
+    for v in values:
+        for s in stats:
+            if s == "mean":
+                count = partial[("count", v)]
+                cols[f"{v}_mean"] = partial[("sum", v)] / count.where(count > 0)
+            elif s == "count":
+                cols[f"{v}_count"] = partial[("count", v)].astype(np.int64)
+            else:
+                cols[f"{v}_{s}"] = partial[(s, v)]
+    return pd.DataFrame(cols).sort_index()
+
+
+def _spill(path, by, values, regions, batch_rows, day_range, buckets, spill_dir) -> int:
+    """Worker: hash-partition one file's keyed rows into ``spill_dir/<bucket>/``; returns rows."""
+    rows = 0
+    for df in _batches(path, _columns(by) + list(values), batch_rows, day_range):
+        keyed = _keyed(df, by, values, regions).reset_index(drop=True)
+        bucket = pd.util.hash_pandas_object(keyed[list(by)], index=False).to_numpy() % buckets
+        for b, part in keyed.groupby(bucket, sort=False):
+            target = Path(spill_dir) / str(b)
+            target.mkdir(exist_ok=True)
+            part.to_parquet(target / f"{uuid.uuid4().hex}.parquet", index=False)
+        rows += len(keyed)
+    return rows
+
+
+def _reduce_bucket(bucket_dir, by, values, stats, quantiles, budget: int) -> pd.DataFrame:
+    """Worker: aggregate one spill bucket, which holds every row of its groups.
+
+    A bucket is sized to fit *budget* bytes, but hashing cannot split a group. With few large
+    groups (``--by region``), a bucket can hold far more. Such a bucket is reduced in two passes
+    instead of being loaded whole. The plain stats are merged from record batches. The
+    quantiles are computed one value column at a time, with only the key columns and that
+    column in memory. A quantile still needs every value of a group at once, so a warning is
+    printed when even that exceeds the budget.
+    """
+    import pyarrow.parquet as pq
+
+    files = sorted(Path(bucket_dir).glob("*.parquet"))
+    rows = sum(pq.ParquetFile(f).metadata.num_rows for f in files)
+    row_bytes = 8 * (len(by) + len(values)) * _ROW_OVERHEAD
+    if rows * row_bytes <= budget:
+        keyed = pd.concat([pd.read_parquet(f) for f in files], ignore_index=True)
+        return _aggregate(keyed, by, values, stats, quantiles)
+
+    column_bytes = 8 * (len(by) + 1) * _ROW_OVERHEAD
+    if rows * column_bytes > budget:
+        print(f"[!] spill bucket {Path(bucket_dir).name}: {rows:,} rows in too few groups to split; "
+              f"exact quantiles need ~{rows * column_bytes / 2**20:,.0f} MB, over the "
+              f"{budget / 2**20:,.0f} MB per-worker budget", flush=True)
+
+    cols = {}
+    if stats:
+        parts = []
+        for f in files:
+            for batch in pq.ParquetFile(f).iter_batches(batch_size=max(budget // row_bytes, 1024)):
+                g = batch.to_pandas().groupby(list(by), sort=False)[list(values)]
+                parts.append(pd.concat({"count": g.count(), "sum": g.sum(), "min": g.min(), "max": g.max()},
+                                       axis=1))
+        cols.update(_finish(_merge(parts, by), values, stats))
+    for v in values:
+        column = pd.concat([pd.read_parquet(f, columns=list(by) + [v]) for f in files], ignore_index=True)
+        g = column.groupby(list(by), sort=True)[v]
+        cols.update({f"{v}_{_quantile_name(q)}": g.quantile(q) for q in quantiles})
+        del column, g
+    order = [f"{v}_{name}" for v in values for name in list(stats) + [_quantile_name(q) for q in quantiles]]
+    return pd.DataFrame(cols)[order].sort_index()
+
+
+def _files(wh, table: str, start: Optional[str], end: Optional[str]) -> List[str]:
+    """Partition files of *table*, pruned to the year/months overlapping *start*..*end*."""
+    import pyarrow.dataset as ds
+
+    expr = None
+    for bound, op in ((start, ">="), (end, "<=")):
+        if bound:
+            d = dt.date.fromisoformat(bound)
+            ym = ds.field("year") * 100 + ds.field("month")
+            e = ym >= d.year * 100 + d.month if op == ">=" else ym <= d.year * 100 + d.month
+            expr = e if expr is None else expr & e
+    return sorted(f.path for f in wh.dataset(table).get_fragments(filter=expr))
+
+
+def _day_range(start: Optional[str], end: Optional[str]):
+    if not start and not end:
+        return None
+    lo = pd.Timestamp(start or "1970-01-01").value // 1_000_000
+    hi = pd.Timestamp(end or "2262-01-01").value // 1_000_000
+    return lo, hi
+
+
+def rollup(wh, by: Sequence[str] = ("country",), values: Sequence[str] = VALUES,
+           stats: Sequence[str] = ("sum", "mean"), quantiles: Sequence[float] = (), *,
+           start: Optional[str] = None, end: Optional[str] = None, table: str = TABLE,
+           max_bytes: int = 1 << 30, jobs: Optional[int] = None,
+           spill_dir: Optional[str] = None) -> pd.DataFrame:
+    """Aggregate *values* of the warehouse's port-activity table by *by* without loading it whole.
+
+    Returns one row per group (indexed by the *by* keys, sorted) with ``<value>_<stat>`` and
+    ``<value>_p<q×100>`` columns, equal to :func:`rollup_frame` on the same rows. *start* and
+    *end* (YYYY-MM-DD, inclusive) restrict the days. Each of the *jobs* worker processes keeps
+    its working set near ``max_bytes / jobs``. Quantile spill files go under *spill_dir*
+    (default: the system temp directory) and are removed afterwards.
+    """
+    _check(by, stats)
+    import pyarrow.parquet as pq
+
+    jobs = jobs or os.cpu_count() or 1
+    values = list(values)
+    files = _files(wh, table, start, end)
+    regs = regions(wh) if "region" in by else None
+    empty = rollup_frame(pd.DataFrame(columns=_columns(by) + values), by, values, stats, quantiles,
+                         regions=regs)
+    if not files:
+        return empty
+
+    budget = max(max_bytes // jobs, 1 << 20)
+    row_bytes = 8 * (len(_columns(by)) + len(by) + len(values)) * _ROW_OVERHEAD
+    batch_rows = max(budget // row_bytes, 1024)
+    day_range = _day_range(start, end)
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        if not quantiles:
+            futures = [pool.submit(_partials, f, by, values, regs, batch_rows, day_range) for f in files]
+            parts = [p for p in (fut.result() for fut in futures) if p is not None]
+            return _finish(_merge(parts, by), values, stats) if parts else empty
+
+        total = sum(pq.ParquetFile(f).metadata.num_rows for f in files)
+        buckets = max(math.ceil(total * row_bytes / budget), 1)
+        tmp = Path(tempfile.mkdtemp(prefix="rollup-", dir=spill_dir))
+        try:
+            futures = [pool.submit(_spill, f, by, values, regs, batch_rows, day_range, buckets, str(tmp))
+                       for f in files]
+            for fut in futures:
+                fut.result()
+            dirs = sorted(p for p in tmp.iterdir() if p.is_dir())
+            futures = [pool.submit(_reduce_bucket, str(d), by, values, stats, quantiles, budget)
+                       for d in dirs]
+            parts = [fut.result() for fut in futures]
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+    return pd.concat(parts).sort_index() if parts else empty
+
+
+###############################################################################
+# Equivalence check                                                            #
+###############################################################################
+
+def _synthetic(ports: int = 200, start: str = "2024-11-01", end: str = "2025-03-31",
+               seed: int = 0) -> pd.DataFrame:
+    """Port-activity-shaped rows (with some missing values) for :func:`check`."""
+    rng = np.random.default_rng(seed)
+    days = pd.date_range(start, end, freq="D")
+    portid = np.repeat(np.arange(1, ports + 1), len(days))
+    day = np.tile(days.as_unit("ms").asi8, ports)
+    df = pd.DataFrame({
+        "portid": portid,
+        "country": np.asarray([f"C{i % 7}" for i in range(ports + 1)])[portid],
+        "day": day,
+        **{v: rng.poisson(20, len(day)).astype(np.float64) for v in VALUES},
+    })
+    df.loc[rng.random(len(df)) < 0.02, "import"] = np.nan
+    return df
+
+
+def check(max_bytes: int = 4 << 20, jobs: int = 4) -> List[str]:
+    """Compare :func:`rollup` with :func:`rollup_frame` on a synthetic warehouse.
+
+    Covers country; region with quantiles, whose few groups overflow their buckets; region +
+    week with quantiles; port + month over a date range. A small *max_bytes* forces several
+    record batches and spill buckets. Returns the cases that differ.
+    """
+    from common.warehouse import Warehouse
+    import portwatch_imf
+
+    df = _synthetic()
+    meta = pd.DataFrame({"portid": np.arange(1, 201), "continent": [f"R{i % 4}" for i in range(200)]})
+    cases = [
+        ("country", dict(by=["country"])),
+        ("region, quantiles (oversized buckets)", dict(by=["region"], stats=list(STATS), quantiles=[0.1, 0.5])),
+        ("region+week, quantiles", dict(by=["region", "week"], stats=list(STATS), quantiles=[0.5, 0.9])),
+        ("port+month, 2024-12-10..2025-02-20",
+         dict(by=["port", "month"], stats=["count", "sum", "min", "max"], start="2024-12-10", end="2025-02-20")),
+    ]
+    failed = []
+    with tempfile.TemporaryDirectory(prefix="rollup-check-") as tmp:
+        wh = Warehouse(tmp)
+        portwatch_imf.store_window(wh, TABLE, df, "2024-11-01", "2025-03-31")
+        wh.write("ports_metadata", meta, mode="replace")
+        regs = regions(wh)
+        for name, kw in cases:
+            kw = {"values": VALUES, **kw}
+            rows = df
+            if "start" in kw:
+                lo, hi = _day_range(kw["start"], kw["end"])
+                rows = df[(df["day"] >= lo) & (df["day"] <= hi)]
+            expected = rollup_frame(rows, kw["by"], kw["values"], kw.get("stats", ("sum", "mean")),
+                                    kw.get("quantiles", ()), regions=regs)
+            got = rollup(wh, max_bytes=max_bytes, jobs=jobs, **kw)
+            try:
+                pd.testing.assert_frame_equal(got, expected, check_dtype=False, check_freq=False)
+            except AssertionError as e:
+                failed.append(name)
+                print(f"[x] {name}: {e}")
+            else:
+                print(f"[✓] {name}: {len(got):,} groups match")
+    return failed
+
+
+###############################################################################
+# CLI                                                                          #
+###############################################################################
+
+def main(argv: Optional[List[str]] = None):
+    p = argparse.ArgumentParser(description="Out-of-core rollups of PortWatch port activity.")
+    p.add_argument("--warehouse", default=os.environ.get("WAREHOUSE_DIR"),
+                   help="warehouse directory (default: $WAREHOUSE_DIR)")
+    sub = p.add_subparsers(dest="command", required=True)
+
+    ing = sub.add_parser("ingest", help="fetch port activity month by month into the warehouse")
+    ing.add_argument("--start", required=True, help="first day (YYYY-MM-DD)")
+    ing.add_argument("--end", default=dt.date.today().isoformat(), help="last day (default: today)")
+    ing.add_argument("--jobs", type=int, default=4, help="months fetched concurrently (default: 4)")
+
+    agg = sub.add_parser("rollup", help="aggregate the stored port activity")
+    agg.add_argument("--by", nargs="+", default=["country"], choices=list(KEYS) + list(PERIODS),
+                     help="group keys (default: country)")
+    agg.add_argument("--values", nargs="+", default=VALUES, help=f"columns (default: {' '.join(VALUES)})")
+    agg.add_argument("--stats", nargs="+", default=["sum", "mean"], choices=STATS)
+    agg.add_argument("--quantiles", nargs="*", type=float, default=[], help="e.g. 0.5 0.9")
+    agg.add_argument("--start", help="first day (YYYY-MM-DD)")
+    agg.add_argument("--end", help="last day (YYYY-MM-DD)")
+    agg.add_argument("--memory-mb", type=int, default=1024,
+                     help="memory ceiling shared by the workers (default: 1024)")
+    agg.add_argument("--jobs", type=int, default=os.cpu_count(), help="worker processes")
+    agg.add_argument("--out", help="write the result here (.csv or .parquet) instead of printing it")
+
+    sub.add_parser("check", help="verify rollup() against rollup_frame() on synthetic data")
+    args = p.parse_args(argv)
+
+    if args.command == "check":
+        if check():
+            raise SystemExit(1)
+        return
+    if not args.warehouse:
+        p.error("--warehouse (or $WAREHOUSE_DIR) is required")
+    from common.warehouse import Warehouse
+    wh = Warehouse(args.warehouse)
+
+    if args.command == "ingest":
+        n = ingest(wh, args.start, args.end, jobs=args.jobs)
+        print(f"[✓] stored {n:,} rows")
+        return
+
+    result = rollup(wh, args.by, args.values, args.stats, args.quantiles, start=args.start,
+                    end=args.end, max_bytes=args.memory_mb << 20, jobs=args.jobs)
+    if not args.out:
+        print(result.to_string())
+    elif args.out.endswith(".parquet"):
+        result.reset_index().to_parquet(args.out, index=False)
+    else:
+        result.to_csv(args.out)
+    if args.out:
+        print(f"[✓] wrote {len(result):,} groups → {Path(args.out).resolve()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Build the generated reports: fetch → indicators → charts → markdown, rebuilding only what is stale.
+
+One branch per watchlist universe (``schwab_realtime_data/universes/*.json``), plus ECB and
+PortWatch branches. All of them feed a top-level index::
+
+    <universe>:fetch → <universe>:indicators → <universe>:charts → <universe>:report ┐
+    ecb:fetch → ecb:charts → ecb:report                                              ├→ index
+    portwatch:fetch → portwatch:charts → portwatch:report                            ┘
+
+Stages are content-hashed (see ``common/build.py``). A stage reruns when its code, config or
+upstream data changed, or when a fetch is older than ``--max-age`` hours. Independent branches
+run in parallel worker processes. Everything is written under ``--out`` (default ``build/``).
+
+Usage
+-----
+```bash
+$ python reports/build_reports.py                      # bring every report up to date
+$ python reports/build_reports.py 'eu_auto:*' --jobs 2  # one branch (plus its upstream)
+$ python reports/build_reports.py --dry-run            # show what is stale and why
+$ python reports/build_reports.py --force '*:fetch'    # refetch everything
+```
+"""
+import argparse
+import datetime as dt
+import os
+import sys
+from pathlib import Path
+
+from common.build import FAILED, Pipeline, Stage
+
+ROOT = Path(__file__).resolve().parent.parent
+SCHWAB = ROOT / "schwab_realtime_data"
+ECB = ROOT / "EU_central_bank"
+PORTWATCH = ROOT / "global_trade_shipping"
+
+CHART_KINDS = ("performance_analysis", "volume_analysis", "risk_return_analysis", "technical_dashboard")
+
+
+###############################################################################
+# Actions (module-level so worker processes can import them)                  #
+###############################################################################
+
+def _close_figures():
+    import matplotlib.pyplot as plt
+    plt.close("all")
+
+
+def fetch_history(symbols, years, out):
+    from custom_quotes import get_price_history
+
+    history = get_price_history(symbols, years)
+    if history.empty:
+        raise RuntimeError("no price history returned")
+    history.to_csv(out, index=False)
+
+
+def compute_indicators(history, out):
+    import pandas as pd
+    from indicators import technical_analysis
+
+    technical_analysis(pd.read_csv(history, parse_dates=["date"])).to_csv(out, index=False)
+
+
+def draw_stock_charts(analysis, title, prefix):
+    import pandas as pd
+    from create_charts import create_all
+
+    create_all(pd.read_csv(analysis), title, prefix, stamp="latest")
+    _close_figures()
+
+
+def write_stock_report(title, analysis, charts, out):
+    import pandas as pd
+
+    df = pd.read_csv(analysis).sort_values("price_roc_3y", ascending=False)
+    lines = [f"# {title}", "", f"Data as of {df['as_of'].max()}.", "", "## Performance", "",
+             "| Symbol | Price | 1D % | 1M % | YTD % | 3Y % | vs SMA200 % | 30D vol % |",
+             "|---|---:|---:|---:|---:|---:|---:|---:|"]
+    for r in df.itertuples():
+        lines.append(f"| {r.symbol} | {r.current_price:.2f} | {r.price_roc_1d:+.1f} | {r.price_roc_1m:+.1f} "
+                     f"| {r.price_roc_ytd:+.1f} | {r.price_roc_3y:+.1f} | {r.price_vs_sma200:+.1f} "
+                     f"| {r.volatility_30d:.1f} |")
+    lines += ["", "## Charts", ""]
+    lines += [f"![{Path(c).stem}]({Path(c).name})" for c in charts]
+    Path(out).write_text("\n".join(lines) + "\n")
+
+
+def fetch_ecb(out):
+    import euro_union
+
+    df = euro_union.load()
+    if df.dropna(how="all").empty:
+        raise RuntimeError("no ECB observations returned")
+    df.to_csv(out, index_label="date")
+
+
+def draw_ecb_chart(data, out):
+    import pandas as pd
+    import euro_union
+
+    euro_union.plot(pd.read_csv(data, index_col="date", parse_dates=True)).savefig(out, dpi=150)
+    _close_figures()
+
+
+def write_ecb_report(data, chart, out):
+    import pandas as pd
+
+    df = pd.read_csv(data, index_col="date", parse_dates=True)
+    lines = ["# Euro Area Indicators", "", "| Series | Latest | As of |", "|---|---:|---|"]
+    for name in df.columns:
+        s = df[name].dropna()
+        if not s.empty:
+            lines.append(f"| {name} | {s.iloc[-1]:,.2f} | {s.index[-1]:%Y-%m-%d} |")
+    lines += ["", f"![ECB dashboard]({Path(chart).name})"]
+    Path(out).write_text("\n".join(lines) + "\n")
+
+
+def fetch_chokepoints(days, transit_out, meta_out):
+    import portwatch_imf
+
+    end = dt.date.today()
+    transit = portwatch_imf.get_chokepoint_transit((end - dt.timedelta(days=days)).isoformat(), end.isoformat())
+    meta = portwatch_imf.get_chokepoints_metadata()
+    # ObjectId is a server-side row number; dropping it keeps unchanged data byte-identical
+    transit.drop(columns="ObjectId", errors="ignore").sort_values(["chokepointid", "day"]).to_csv(transit_out, index=False)
+    meta.drop(columns="ObjectId", errors="ignore").sort_values("chokepointid").to_csv(meta_out, index=False)
+
+
+def _chokepoint_daily(transit):
+    import pandas as pd
+
+    df = pd.read_csv(transit)
+    df["day"] = pd.to_datetime(df["day"], unit="ms")
+    return df.pivot_table(index="day", columns="portname", values="n_total", aggfunc="sum").sort_index()
+
+
+def draw_chokepoint_chart(transit, out, top=8):
+    import matplotlib.pyplot as plt
+
+    daily = _chokepoint_daily(transit)
+    busiest = daily.sum().nlargest(top).index
+    fig, ax = plt.subplots(figsize=(14, 7))
+    daily[busiest].rolling(7, min_periods=1).mean().plot(ax=ax)
+    ax.set_title("Daily transit calls, 7-day average (busiest chokepoints)")
+    ax.set_ylabel("vessels / day")
+    ax.grid(True, alpha=0.3)
+    fig.tight_layout()
+    fig.savefig(out, dpi=150)
+    _close_figures()
+
+
+def write_chokepoint_report(transit, chart, out):
+    daily = _chokepoint_daily(transit)
+    last7 = daily.tail(7).mean()
+    prior28 = daily.iloc[-35:-7].mean()
+    change = ((last7 / prior28 - 1) * 100).sort_values()
+    lines = ["# Chokepoint Transits", "", f"Data through {daily.index.max():%Y-%m-%d}.", "",
+             "| Chokepoint | Last 7d avg | Prior 28d avg | Change % |", "|---|---:|---:|---:|"]
+    for name, pct in change.items():
+        lines.append(f"| {name} | {last7[name]:.1f} | {prior28[name]:.1f} | {pct:+.1f} |")
+    lines += ["", f"![chokepoint transits]({Path(chart).name})"]
+    Path(out).write_text("\n".join(lines) + "\n")
+
+
+def write_index(reports, out):
+    lines = ["# Generated Reports", ""]
+    for report in reports:
+        title = Path(report).read_text().splitlines()[0].lstrip("# ")
+        lines.append(f"- [{title}]({Path(report).relative_to(Path(out).parent)})")
+    Path(out).write_text("\n".join(lines) + "\n")
+
+
+###############################################################################
+# Graph                                                                        #
+###############################################################################
+
+def _script_dirs():
+    """Make the fetch/chart scripts importable; worker processes inherit ``sys.path``."""
+    for d in (SCHWAB, ECB, PORTWATCH):
+        if str(d) not in sys.path:
+            sys.path.insert(0, str(d))
+
+
+def pipeline(out="build", years=3, days=365, max_age_hours=12.0) -> Pipeline:
+    """The report DAG rooted at *out*."""
+    _script_dirs()
+    from universe import load_universes, universe_dir
+
+    out = Path(out)
+    max_age = max_age_hours * 3600
+    p = Pipeline(out / ".state.json")
+    reports = []
+
+    for u in load_universes():
+        d = out / u.name
+        history, analysis = d / "history.csv", d / f"{u.prefix}_technical_analysis.csv"
+        charts = [d / f"{u.prefix}_{kind}_latest.png" for kind in CHART_KINDS]
+        report = d / "report.md"
+        p.add(Stage(f"{u.name}:fetch", fetch_history, max_age=max_age,
+                    inputs=[universe_dir() / f"{u.name}.json", SCHWAB / "custom_quotes.py"],
+                    outputs=[history],
+                    params=dict(symbols=list(u.symbols), years=years, out=str(history))))
+        p.add(Stage(f"{u.name}:indicators", compute_indicators, deps=[f"{u.name}:fetch"],
+                    inputs=[SCHWAB / "indicators.py"], outputs=[analysis],
+                    params=dict(history=str(history), out=str(analysis))))
+        p.add(Stage(f"{u.name}:charts", draw_stock_charts, deps=[f"{u.name}:indicators"],
+                    inputs=[SCHWAB / "create_charts.py"], outputs=charts,
+                    params=dict(analysis=str(analysis), title=u.chart_title, prefix=str(d / u.prefix))))
+        p.add(Stage(f"{u.name}:report", write_stock_report, deps=[f"{u.name}:indicators", f"{u.name}:charts"],
+                    inputs=[__file__], outputs=[report],
+                    params=dict(title=u.chart_title, analysis=str(analysis),
+                                charts=[str(c) for c in charts], out=str(report))))
+        reports.append(report)
+
+    d = out / "ecb"
+    data, chart, report = d / "ecb.csv", d / "ecb_dashboard.png", d / "report.md"
+    p.add(Stage("ecb:fetch", fetch_ecb, max_age=max_age, inputs=[ECB / "euro_union.py"],
+                outputs=[data], params=dict(out=str(data))))
+    p.add(Stage("ecb:charts", draw_ecb_chart, deps=["ecb:fetch"], inputs=[ECB / "euro_union.py"],
+                outputs=[chart], params=dict(data=str(data), out=str(chart))))
+    p.add(Stage("ecb:report", write_ecb_report, deps=["ecb:fetch", "ecb:charts"], inputs=[__file__],
+                outputs=[report], params=dict(data=str(data), chart=str(chart), out=str(report))))
+    reports.append(report)
+
+    d = out / "portwatch"
+    transit, meta = d / "chokepoint_transit.csv", d / "chokepoints_metadata.csv"
+    chart, report = d / "chokepoint_transits.png", d / "report.md"
+    p.add(Stage("portwatch:fetch", fetch_chokepoints, max_age=max_age,
+                inputs=[PORTWATCH / "portwatch_imf.py"], outputs=[transit, meta],
+                params=dict(days=days, transit_out=str(transit), meta_out=str(meta))))
+    p.add(Stage("portwatch:charts", draw_chokepoint_chart, deps=["portwatch:fetch"], inputs=[__file__],
+                outputs=[chart], params=dict(transit=str(transit), out=str(chart))))
+    p.add(Stage("portwatch:report", write_chokepoint_report, deps=["portwatch:fetch", "portwatch:charts"],
+                inputs=[__file__], outputs=[report],
+                params=dict(transit=str(transit), chart=str(chart), out=str(report))))
+    reports.append(report)
+
+    index = out / "README.md"
+    p.add(Stage("index", write_index, deps=[n for n in p.stages if n.endswith(":report")],
+                outputs=[index], params=dict(reports=[str(r) for r in reports], out=str(index))))
+    return p
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Incrementally rebuild the generated reports.")
+    parser.add_argument("targets", nargs="*", help="stages to build, as globs (default: all)")
+    parser.add_argument("--out", default="build", help="output directory (default: build)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="parallel worker processes")
+    parser.add_argument("--force", action="append", default=[], metavar="GLOB",
+                        help="rebuild matching stages even if up to date (repeatable)")
+    parser.add_argument("--max-age", type=float, default=12.0,
+                        help="hours before fetched data is considered stale (default: 12)")
+    parser.add_argument("--years", type=int, default=3, help="years of price history")
+    parser.add_argument("--days", type=int, default=365, help="days of chokepoint transits")
+    parser.add_argument("--dry-run", action="store_true", help="only report what is stale")
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("MPLBACKEND", "Agg")   # worker processes render to files only
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    p = pipeline(args.out, args.years, args.days, args.max_age)
+    status = p.run(args.targets or None, jobs=args.jobs, force=args.force, dry_run=args.dry_run)
+    counts = {s: list(status.values()).count(s) for s in sorted(set(status.values()))}
+    print(", ".join(f"{n} {s}" for s, n in counts.items()))
+    if FAILED in status.values():
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""
+Declarative alert rules evaluated on every quote update.
+
+A rule is a small expression over the columns of the quote frame. It is parsed once, checked
+against a whitelist, and compiled into a NumPy expression. An update then runs every rule over
+all symbols in one vectorised pass. Per-symbol state (the previous update's values, debounce
+streaks, last-fired times) lives in arrays indexed by a symbol → slot map, so there are no
+per-symbol Python loops.
+
+Rule syntax
+-----------
+``when`` may use frame columns (``last``, ``close``, ``volume``, ``high_52w``, ``low_52w``,
+``change_pct``, plus anything else the frame carries, e.g. ``avg_volume_30d``), numbers,
+arithmetic, comparisons, ``and``/``or``/``not``, and:
+
+    abs(x), min(a, b), max(a, b)
+    prev(expr)                  value of *expr* at this symbol's previous update
+    crosses_above(a, b)         a >= b now and a < b at the previous update
+    crosses_below(a, b)
+
+``debounce`` is the number of consecutive updates the condition must hold. ``cooldown`` is the
+minimum number of seconds between two firings of one rule for one symbol.
+
+Per-symbol state can be saved to an ``.npz`` file and restored, so ``prev`` and the crossing
+functions also work across separate one-shot runs (the previous update is then the last run).
+
+Usage
+-----
+```python
+from alerts import AlertEngine, DEFAULT_RULES, LogSink, FileSink
+
+engine = AlertEngine(DEFAULT_RULES, sinks=[LogSink(), FileSink("alerts.jsonl")])
+engine.load_state("alert_state.npz")
+fired = engine.update(frame)     # frame: one row per symbol, numeric columns
+engine.save_state("alert_state.npz")
+```
+"""
+import ast
+import json
+import os
+import time
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+DEFAULT_RULES = [
+    {"name": "cross_52w_high", "when": "crosses_above(last, high_52w)", "cooldown": 3600},
+    {"name": "cross_52w_low", "when": "crosses_below(last, low_52w)", "cooldown": 3600},
+    {"name": "move_3pct", "when": "abs(change_pct) > 3", "cooldown": 900},
+    {"name": "volume_2x_30d", "when": "volume > 2 * avg_volume_30d", "debounce": 2, "cooldown": 3600},
+]
+
+_PREV = "__prev_"
+_FUNCS = {"abs": "_abs", "min": "_min", "max": "_max"}
+_ALLOWED = (ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.USub, ast.UAdd,
+            ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.Mod,
+            ast.Compare, ast.Gt, ast.GtE, ast.Lt, ast.LtE, ast.Eq, ast.NotEq,
+            ast.Call, ast.Name, ast.Load, ast.Constant)
+
+
+class RuleError(ValueError):
+    """A rule that does not parse or uses something outside the rule syntax."""
+
+
+class _ToPrev(ast.NodeTransformer):
+    """Rewrite column names to their previous-update counterparts."""
+
+    def visit_Name(self, node):
+        return ast.copy_location(ast.Name(id=_PREV + node.id, ctx=ast.Load()), node)
+
+
+class _ToNumpy(ast.NodeTransformer):
+    """Lower the rule syntax to elementwise NumPy operations."""
+
+    def __init__(self):
+        self.columns = set()
+
+    def visit_Name(self, node):
+        if not node.id.startswith(_PREV):
+            self.columns.add(node.id)
+        else:
+            self.columns.add(node.id[len(_PREV):])
+        return node
+
+    def visit_BoolOp(self, node):
+        self.generic_visit(node)
+        op = ast.BitAnd() if isinstance(node.op, ast.And) else ast.BitOr()
+        out = node.values[0]
+        for v in node.values[1:]:
+            out = ast.BinOp(left=out, op=op, right=v)
+        return ast.copy_location(out, node)
+
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Not):
+            return ast.copy_location(ast.UnaryOp(op=ast.Invert(), operand=node.operand), node)
+        return node
+
+    def visit_Compare(self, node):
+        self.generic_visit(node)
+        # a < b < c  →  (a < b) & (b < c), since NumPy arrays cannot chain comparisons
+        left, parts = node.left, []
+        for op, right in zip(node.ops, node.comparators):
+            parts.append(ast.Compare(left=left, ops=[op], comparators=[right]))
+            left = right
+        out = parts[0]
+        for p in parts[1:]:
+            out = ast.BinOp(left=out, op=ast.BitAnd(), right=p)
+        return ast.copy_location(out, node)
+
+    def visit_Call(self, node):
+        if not isinstance(node.func, ast.Name) or node.keywords:
+            raise RuleError("only plain function calls are allowed")
+        fn, args = node.func.id, node.args
+        if fn == "prev" and len(args) == 1:
+            return self.visit(_ToPrev().visit(args[0]))
+        if fn in ("crosses_above", "crosses_below") and len(args) == 2:
+            a, b = args
+            now_op, was_op = (ast.GtE(), ast.Lt()) if fn == "crosses_above" else (ast.LtE(), ast.Gt())
+            now = ast.Compare(left=a, ops=[now_op], comparators=[b])
+            was = ast.Compare(left=_ToPrev().visit(_clone(a)), ops=[was_op],
+                              comparators=[_ToPrev().visit(_clone(b))])
+            return self.visit(ast.BinOp(left=now, op=ast.BitAnd(), right=was))
+        if fn in _FUNCS:
+            node.func = ast.Name(id=_FUNCS[fn], ctx=ast.Load())
+            node.args = [self.visit(a) for a in args]
+            return node
+        raise RuleError(f"unknown function {fn}()")
+
+
+def _clone(node):
+    return ast.parse(ast.unparse(node), mode="eval").body
+
+
+class Rule:
+    """One compiled alert rule."""
+
+    def __init__(self, name: str, when: str, *, debounce: int = 1, cooldown: float = 0.0,
+                 message: Optional[str] = None):
+        self.name = name
+        self.when = when
+        self.debounce = max(int(debounce), 1)
+        self.cooldown = float(cooldown)
+        self.message = message or when
+        try:
+            tree = ast.parse(when, mode="eval")
+        except SyntaxError as e:
+            raise RuleError(f"{name}: {e}") from e
+        for node in ast.walk(tree):
+            if not isinstance(node, _ALLOWED):
+                raise RuleError(f"{name}: {type(node).__name__} is not allowed in rules")
+        lowered = _ToNumpy()
+        try:
+            tree = ast.fix_missing_locations(lowered.visit(tree))
+        except RuleError as e:
+            raise RuleError(f"{name}: {e}") from None
+        self.columns = lowered.columns
+        self._code = compile(tree, f"<rule {name}>", "eval")
+
+    @classmethod
+    def from_dict(cls, spec: dict) -> "Rule":
+        return cls(spec["name"], spec["when"], debounce=spec.get("debounce", 1),
+                   cooldown=spec.get("cooldown", 0.0), message=spec.get("message"))
+
+    def evaluate(self, env: dict) -> np.ndarray:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.asarray(eval(self._code, {"__builtins__": {}}, env), dtype=bool)
+
+
+def load_rules(path: str) -> List[Rule]:
+    """Read rules from a JSON file holding a list of ``{"name", "when", ...}`` objects."""
+    return [Rule.from_dict(spec) for spec in json.loads(Path(path).read_text())]
+
+
+###############################################################################
+# Sinks                                                                       #
+###############################################################################
+
+class LogSink:
+    """Log each alert through loguru."""
+
+    def __call__(self, alerts: pd.DataFrame):
+        for rec in alerts.to_dict("records"):
+            logger.warning(f"ALERT {rec['rule']}: {rec['symbol']} last={rec.get('last')} ({rec['message']})")
+
+
+class FileSink:
+    """Append alerts to a JSON Lines file."""
+
+    def __init__(self, path: str = "alerts.jsonl"):
+        self.path = Path(path)
+
+    def __call__(self, alerts: pd.DataFrame):
+        text = alerts.to_json(orient="records", lines=True, date_format="iso")
+        with open(self.path, "a") as f:
+            f.write(text if text.endswith("\n") else text + "\n")
+
+
+class WebhookSink:
+    """POST each batch of alerts as a JSON array (see :func:`webhook_stub` for a local receiver)."""
+
+    def __init__(self, url: str = "http://127.0.0.1:8787/alerts", timeout: float = 5.0):
+        self.url = url
+        self.timeout = timeout
+
+    def __call__(self, alerts: pd.DataFrame):
+        import requests
+
+        try:
+            requests.post(self.url, data=alerts.to_json(orient="records", date_format="iso"),
+                          headers={"Content-Type": "application/json"}, timeout=self.timeout)
+        except requests.RequestException as e:
+            logger.error(f"Webhook {self.url} failed: {e}")
+
+
+def webhook_stub(port: int = 8787):
+    """Run a local endpoint that prints every alert POSTed to it (blocks)."""
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            for rec in json.loads(body or b"[]"):
+                print(f"[webhook] {rec.get('rule')}: {rec.get('symbol')} {rec}")
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    print(f"Webhook stub listening on http://127.0.0.1:{port}/alerts")
+    HTTPServer(("127.0.0.1", port), Handler).serve_forever()
+
+
+###############################################################################
+# Engine                                                                      #
+###############################################################################
+
+class AlertEngine:
+    """Evaluate rules over whole quote frames and dispatch matches to sinks.
+
+    *reference* is an optional per-symbol frame (indexed by symbol, e.g. :func:`volume_baseline`)
+    whose columns are joined onto every update.
+    """
+
+    def __init__(self, rules: Iterable = DEFAULT_RULES, sinks: Iterable = (),
+                 reference: Optional[pd.DataFrame] = None):
+        self.rules = [r if isinstance(r, Rule) else Rule.from_dict(r) for r in rules]
+        self.sinks = list(sinks)
+        self.reference = reference
+        self._slots = pd.Index([], dtype=object)
+        self._prev = {}
+        self._streak = {r.name: np.zeros(0, dtype=np.int64) for r in self.rules}
+        self._fired_at = {r.name: np.zeros(0) for r in self.rules}
+        self._missing_warned = set()
+
+    def _slot_index(self, symbols: np.ndarray) -> np.ndarray:
+        idx = self._slots.get_indexer(symbols)
+        new = idx < 0
+        if new.any():
+            added = pd.Index(pd.unique(symbols[new]))
+            self._slots = self._slots.append(added)
+            grow = len(added)
+            self._prev = {c: np.concatenate([v, np.full(grow, np.nan)]) for c, v in self._prev.items()}
+            for name in self._streak:
+                self._streak[name] = np.concatenate([self._streak[name], np.zeros(grow, np.int64)])
+                self._fired_at[name] = np.concatenate([self._fired_at[name], np.full(grow, -np.inf)])
+            idx = self._slots.get_indexer(symbols)
+        return idx
+
+    # ------------------------------------------------------------------ persistence
+
+    def save_state(self, path):
+        """Write the per-symbol state (previous values, streaks, last firings) to *path*."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        arrays = {"symbols": self._slots.to_numpy(dtype=str)}
+        arrays.update({f"prev:{c}": v for c, v in self._prev.items()})
+        arrays.update({f"streak:{n}": v for n, v in self._streak.items()})
+        arrays.update({f"fired_at:{n}": v for n, v in self._fired_at.items()})
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, path)
+
+    def load_state(self, path) -> bool:
+        """Restore state saved by :meth:`save_state`; returns ``False`` if *path* does not exist.
+
+        State of rules that are no longer configured is dropped; new rules start fresh.
+        """
+        if not Path(path).exists():
+            return False
+        with np.load(path, allow_pickle=False) as z:
+            self._slots = pd.Index(z["symbols"].astype(object), dtype=object)
+            self._prev = {k.split(":", 1)[1]: z[k] for k in z.files if k.startswith("prev:")}
+            grow = len(self._slots)
+            for name in self._streak:
+                saved = f"streak:{name}" in z.files
+                self._streak[name] = z[f"streak:{name}"] if saved else np.zeros(grow, np.int64)
+                self._fired_at[name] = z[f"fired_at:{name}"] if saved else np.full(grow, -np.inf)
+        return True
+
+    # ------------------------------------------------------------------ updates
+
+    def update(self, frame: pd.DataFrame, now: Optional[float] = None) -> pd.DataFrame:
+        """Evaluate every rule on *frame* (one row per ``symbol``) and return the fired alerts."""
+        now = time.time() if now is None else now
+        if self.reference is not None:
+            frame = frame.join(self.reference, on="symbol")
+        if "change_pct" not in frame.columns and {"last", "close"} <= set(frame.columns):
+            with np.errstate(invalid="ignore", divide="ignore"):
+                frame = frame.assign(change_pct=np.where(frame["close"] != 0,
+                                                         (frame["last"] / frame["close"] - 1) * 100, 0.0))
+        symbols = frame["symbol"].to_numpy(dtype=object)
+        idx = self._slot_index(symbols)
+
+        numeric = [c for c in frame.columns if c != "symbol" and pd.api.types.is_numeric_dtype(frame[c])]
+        env = {"_abs": np.abs, "_min": np.minimum, "_max": np.maximum}
+        for c in numeric:
+            env[c] = frame[c].to_numpy(dtype=np.float64)
+            env[_PREV + c] = self._prev[c][idx] if c in self._prev else np.full(len(idx), np.nan)
+
+        fired_parts = []
+        for rule in self.rules:
+            missing = rule.columns - set(numeric)
+            if missing:
+                if rule.name not in self._missing_warned:
+                    logger.warning(f"Rule {rule.name} skipped: frame has no {', '.join(sorted(missing))}")
+                    self._missing_warned.add(rule.name)
+                continue
+            cond = np.broadcast_to(rule.evaluate(env), idx.shape)
+            streak = self._streak[rule.name]
+            streak[idx] = np.where(cond, streak[idx] + 1, 0)
+            fired_at = self._fired_at[rule.name]
+            fire = cond & (streak[idx] >= rule.debounce) & (now - fired_at[idx] >= rule.cooldown)
+            if fire.any():
+                fired_at[idx[fire]] = now
+                fired_parts.append(frame.loc[fire, ["symbol"] + numeric]
+                                   .assign(rule=rule.name, message=rule.message))
+
+        for c in numeric:
+            if c not in self._prev:
+                self._prev[c] = np.full(len(self._slots), np.nan)
+            self._prev[c][idx] = env[c]
+
+        if not fired_parts:
+            return pd.DataFrame(columns=["ts", "rule", "symbol", "message"])
+        alerts = pd.concat(fired_parts, ignore_index=True)
+        alerts.insert(0, "ts", pd.Timestamp.fromtimestamp(now))
+        for sink in self.sinks:
+            sink(alerts)
+        return alerts
+
+
+def volume_baseline(warehouse, days: int = 30) -> pd.DataFrame:
+    """Average daily volume per symbol over the *days* days before today in the ``quotes`` table.
+
+    Today is left out: its volume is still accumulating and would drag the average down.
+    """
+    today = pd.Timestamp.now().normalize()
+    cutoff = (today - pd.Timedelta(days=days)).strftime("%Y-%m-%d")
+    q = warehouse.query("quotes", columns=["date", "symbol", "volume"],
+                        filters=[("date", ">=", cutoff), ("date", "<", today.strftime("%Y-%m-%d"))])
+    daily = q.groupby(["symbol", "date"], observed=True)["volume"].max()
+    return daily.groupby(level="symbol", observed=True).mean().rename(f"avg_volume_{days}d").to_frame()
+
+
+if __name__ == "__main__":
+    webhook_stub()
@@ -1,20 +1,35 @@
 #!/usr/bin/env python3
 
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-import numpy as np
 from datetime import datetime
 import os
 
-plt.style.use('seaborn-v0_8')
-sns.set_palette("husl")
+from common import metrics
 
-def load_latest_analysis():
-    """Load the most recent technical analysis CSV file."""
-    files = [f for f in os.listdir('.') if f.startswith('eu_auto_technical_analysis_') and f.endswith('.csv')]
+# matplotlib/seaborn are imported (and the global style applied) on first chart, not at import.
+plt = None
+sns = None
+
+# Chart titles and file prefix; a universe config (see universe.py) supplies its own.
+TITLE = 'European Auto Manufacturers'
+PREFIX = 'eu_auto'
+
+def _plotting():
+    """Import matplotlib/seaborn and apply the chart style once."""
+    global plt, sns
+    if plt is None:
+        import matplotlib.pyplot as _plt
+        import seaborn as _sns
+        _plt.style.use('seaborn-v0_8')
+        _sns.set_palette("husl")
+        plt, sns = _plt, _sns
+
+def load_latest_analysis(prefix=PREFIX):
+    """Load the most recent ``<prefix>_technical_analysis_*.csv`` file."""
+    import pandas as pd
+
+    files = [f for f in os.listdir('.') if f.startswith(f'{prefix}_technical_analysis_') and f.endswith('.csv')]
     if not files:
-        raise FileNotFoundError("No EU auto technical analysis CSV files found")
+        raise FileNotFoundError(f"No {prefix} technical analysis CSV files found")
     
     latest_file = sorted(files)[-1]
     print(f"Loading data from: {latest_file}")
@@ -22,10 +37,12 @@ def load_latest_analysis():
     df = pd.read_csv(latest_file)
     return df
 
-def create_performance_chart(df):
+@metrics.timed("charts.performance")
+def create_performance_chart(df, title=TITLE, prefix=PREFIX, stamp=None):
     """Create performance comparison chart."""
+    _plotting()
     fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(16, 12))
-    fig.suptitle('European Auto Manufacturers - Performance Analysis', fontsize=16, fontweight='bold')
+    fig.suptitle(f'{title} - Performance Analysis', fontsize=16, fontweight='bold')
     
     # 3-Year Performance
     perf_data = df.sort_values('price_roc_3y', ascending=True)
@@ -67,16 +84,19 @@ def create_performance_chart(df):
     ax4.grid(True, alpha=0.3)
     
     plt.tight_layout()
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = f'eu_auto_performance_analysis_{timestamp}.png'
-    plt.savefig(filename, dpi=300, bbox_inches='tight')
+    timestamp = stamp or datetime.now().strftime('%Y%m%d_%H%M%S')
+    filename = f'{prefix}_performance_analysis_{timestamp}.png'
+    with metrics.span("charts.savefig"):
+        plt.savefig(filename, dpi=300, bbox_inches='tight')
     print(f"Performance chart saved: {filename}")
     plt.show()
 
-def create_volume_analysis_chart(df):
+@metrics.timed("charts.volume")
+def create_volume_analysis_chart(df, title=TITLE, prefix=PREFIX, stamp=None):
     """Create volume analysis chart."""
+    _plotting()
     fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(16, 12))
-    fig.suptitle('European Auto Manufacturers - Volume Analysis', fontsize=16, fontweight='bold')
+    fig.suptitle(f'{title} - Volume Analysis', fontsize=16, fontweight='bold')
     
     # Volume ROC 1-Day
     vol_roc_data = df.sort_values('volume_roc_1d', ascending=True)
@@ -122,16 +142,19 @@ def create_volume_analysis_chart(df):
     ax4.grid(True, alpha=0.3)
     
     plt.tight_layout()
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = f'eu_auto_volume_analysis_{timestamp}.png'
-    plt.savefig(filename, dpi=300, bbox_inches='tight')
+    timestamp = stamp or datetime.now().strftime('%Y%m%d_%H%M%S')
+    filename = f'{prefix}_volume_analysis_{timestamp}.png'
+    with metrics.span("charts.savefig"):
+        plt.savefig(filename, dpi=300, bbox_inches='tight')
     print(f"Volume analysis chart saved: {filename}")
     plt.show()
 
-def create_risk_return_chart(df):
+@metrics.timed("charts.risk_return")
+def create_risk_return_chart(df, title=TITLE, prefix=PREFIX, stamp=None):
     """Create risk-return analysis chart."""
+    _plotting()
     fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(16, 12))
-    fig.suptitle('European Auto Manufacturers - Risk & Return Analysis', fontsize=16, fontweight='bold')
+    fig.suptitle(f'{title} - Risk & Return Analysis', fontsize=16, fontweight='bold')
     
     # Risk-Return Scatter (3-year return vs volatility)
     ax1.scatter(df['volatility_30d'], df['price_roc_3y'], alpha=0.7, s=100, c=df['price_roc_3y'], 
@@ -175,18 +198,21 @@ def create_risk_return_chart(df):
         ax4.axvline(x=price, color='red', alpha=0.3, linestyle='--')
     
     plt.tight_layout()
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = f'eu_auto_risk_return_analysis_{timestamp}.png'
-    plt.savefig(filename, dpi=300, bbox_inches='tight')
+    timestamp = stamp or datetime.now().strftime('%Y%m%d_%H%M%S')
+    filename = f'{prefix}_risk_return_analysis_{timestamp}.png'
+    with metrics.span("charts.savefig"):
+        plt.savefig(filename, dpi=300, bbox_inches='tight')
     print(f"Risk-return analysis chart saved: {filename}")
     plt.show()
 
-def create_summary_dashboard(df):
+@metrics.timed("charts.dashboard")
+def create_summary_dashboard(df, title=TITLE, prefix=PREFIX, stamp=None):
     """Create a comprehensive summary dashboard."""
+    _plotting()
     fig = plt.figure(figsize=(20, 12))
     gs = fig.add_gridspec(3, 4, hspace=0.3, wspace=0.3)
     
-    fig.suptitle('European Auto Manufacturers - Technical Analysis Dashboard', fontsize=20, fontweight='bold')
+    fig.suptitle(f'{title} - Technical Analysis Dashboard', fontsize=20, fontweight='bold')
     
     # 1. 3-Year Performance (Top Left)
     ax1 = fig.add_subplot(gs[0, :2])
@@ -247,33 +273,59 @@ def create_summary_dashboard(df):
     ax5.set_title('Performance Matrix Across All Timeframes', fontweight='bold')
     ax5.set_ylabel('')
     
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = f'eu_auto_technical_dashboard_{timestamp}.png'
-    plt.savefig(filename, dpi=300, bbox_inches='tight')
+    timestamp = stamp or datetime.now().strftime('%Y%m%d_%H%M%S')
+    filename = f'{prefix}_technical_dashboard_{timestamp}.png'
+    with metrics.span("charts.savefig"):
+        plt.savefig(filename, dpi=300, bbox_inches='tight')
     print(f"Technical analysis dashboard saved: {filename}")
     plt.show()
 
-def main():
-    """Main function to create all charts."""
+def create_all(df, title=TITLE, prefix=PREFIX, stamp=None):
+    """Render the four chart types for one analysis frame.
+
+    Files are named ``<prefix>_<chart>_<stamp>.png``; *stamp* defaults to the current time.
+    """
+    print("\n1. Creating performance analysis chart...")
+    create_performance_chart(df, title, prefix, stamp)
+    
+    print("\n2. Creating volume analysis chart...")
+    create_volume_analysis_chart(df, title, prefix, stamp)
+    
+    print("\n3. Creating risk-return analysis chart...")
+    create_risk_return_chart(df, title, prefix, stamp)
+    
+    print("\n4. Creating comprehensive dashboard...")
+    create_summary_dashboard(df, title, prefix, stamp)
+
+def main(argv=None):
+    """Main function to create all charts for each universe (see universe.py)."""
+    import argparse
+    from dotenv import load_dotenv
+    from universe import available, load_universes
+
+    load_dotenv()  # $UNIVERSE_DIR may come from .env
+    parser = argparse.ArgumentParser(description="Technical analysis charts per watchlist universe.")
+    parser.add_argument("--universe", action="append", choices=available(),
+                        help="universe to chart (repeatable; default: every universe with an analysis CSV)")
+    args = parser.parse_args(argv)
+
     try:
         print("Creating Technical Analysis Charts")
         print("=================================")
- 
-        df = load_latest_analysis()
-        print(f"Loaded data for {len(df)} stocks")
- 
-        print("\n1. Creating performance analysis chart...")
-        create_performance_chart(df)
-        
-        print("\n2. Creating volume analysis chart...")
-        create_volume_analysis_chart(df)
-        
-        print("\n3. Creating risk-return analysis chart...")
-        create_risk_return_chart(df)
-        
-        print("\n4. Creating comprehensive dashboard...")
-        create_summary_dashboard(df)
-        
+
+        done = 0
+        for u in load_universes(args.universe):
+            try:
+                df = load_latest_analysis(u.prefix)
+            except FileNotFoundError as e:
+                print(f"Skipping {u.name}: {e}")
+                continue
+            print(f"\n[{u.name}] Loaded data for {len(df)} stocks")
+            create_all(df, u.chart_title, u.prefix)
+            done += 1
+
+        if not done:
+            raise FileNotFoundError("No technical analysis CSV files found for any universe")
         print("\n✅ All charts created successfully!")
         
     except Exception as e:
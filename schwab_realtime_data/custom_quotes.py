@@ -2,35 +2,22 @@
 """
 Custom Schwab API Quotes Fetcher
 
-Fetches current quotes for specific symbols including Auto Manufacturers and S&P 500.
+Fetches current quotes for the watchlist universes configured in ``universes/`` (European and
+US automakers, financials, ...). Symbols shared between universes are fetched once per cycle.
 """
 
 import os
 import json
-import requests
-import pandas as pd
+import time
 from datetime import datetime
 from loguru import logger
-from dotenv import load_dotenv
 
-load_dotenv()
+from common import metrics
 
-# European Auto Manufacturer stocks
-SYMBOLS = {
-    "VWAGY": "Volkswagen AG",
-    "MBGYY": "Mercedes-Benz Group AG",
-    "BMWYY": "BMW AG",
-    "RACE": "Ferrari N.V.",
-    "POAHY": "Porsche Automobil Holding SE",
-    "STLA": "Stellantis N.V.",
 
-    "^GSPC": "S&P 500 Index",
-
-    "CARZ": "First Trust NASDAQ Transportation ETF",
-    "IDRV": "iShares Self-Driving EV and Tech ETF"
-}
-
-BASE_URL = "https://api.schwabapi.com/marketdata/v1"
+def base_url() -> str:
+    """Market-data API root, read at call time so ``$SCHWAB_MARKETDATA_URL`` from ``.env`` applies."""
+    return os.getenv("SCHWAB_MARKETDATA_URL", "https://api.schwabapi.com/marketdata/v1")
 
 
 def load_access_token(token_path: str = "tokens.json") -> str:
@@ -52,9 +39,17 @@ def load_access_token(token_path: str = "tokens.json") -> str:
         raise
 
 
-def get_quotes(symbols_list):
-    """Get current quotes for specified symbols."""
-    
+@metrics.timed("quotes.get_quotes")
+def get_quotes(symbols_list, names=None, store=None, warehouse=None, alerts=None):
+    """Get current quotes for specified symbols, labelled with the *names* mapping when given.
+
+    If *store* (a :class:`tick_store.TickStore`) is given, the raw snapshot is appended to it;
+    if *warehouse* (a :class:`common.warehouse.Warehouse`) is given, it goes to its ``quotes`` table;
+    if *alerts* (an :class:`alerts.AlertEngine`) is given, its rules are evaluated on the snapshot.
+    """
+    import requests
+    import pandas as pd
+
     access_token = load_access_token()
     headers = {"Authorization": f"Bearer {access_token}"}
     
@@ -63,17 +58,22 @@ def get_quotes(symbols_list):
     logger.info(f"Fetching quotes for {len(symbols_list)} symbols...")
     
     try:
-        response = requests.get(
-            f"{BASE_URL}/quotes",
-            params={"symbols": symbols_str},
-            headers=headers
-        )
+        with metrics.span("quotes.http") as s:
+            response = requests.get(
+                f"{base_url()}/quotes",
+                params={"symbols": symbols_str},
+                headers=headers
+            )
+            s.add(bytes=len(response.content))
         
         if response.status_code != 200:
             logger.error(f"API request failed: {response.status_code} - {response.text}")
             return None
         
-        data = response.json()
+        with metrics.span("quotes.decode"):
+            data = response.json()
+
+        snapshot = {sym: data[sym]["quote"] for sym in symbols_list if sym in data}
         results = []
         
         for symbol in symbols_list:
@@ -92,7 +92,7 @@ def get_quotes(symbols_list):
                 
                 results.append({
                     "Symbol": symbol,
-                    "Company": SYMBOLS.get(symbol, "Unknown"),
+                    "Company": (names or {}).get(symbol, "Unknown"),
                     "Last_Price": round(last_price, 2),
                     "Prev_Close": round(close_price, 2),
                     "Change_%": round(pct_change, 2),
@@ -104,93 +104,342 @@ def get_quotes(symbols_list):
             else:
                 logger.warning(f"No data returned for {symbol}")
         
-        return pd.DataFrame(results)
+        with metrics.span("quotes.dataframe") as s:
+            df = pd.DataFrame(results)
+            s.add(rows=len(df))
         
     except Exception as e:
         logger.error(f"Error fetching quotes: {e}")
         return None
 
+    _deliver(snapshot, store, warehouse, alerts)
+    return df
+
+
+def _deliver(snapshot, store=None, warehouse=None, alerts=None):
+    """Hand a fetched snapshot to the optional sinks.
+
+    Each sink runs on its own: one that fails is logged and skipped, and never costs the caller
+    the quotes that were already fetched.
+    """
+    if not snapshot:
+        return
+    if store is not None:
+        try:
+            with metrics.span("quotes.tick_append") as s:
+                store.append_quotes(snapshot)
+                s.add(rows=len(snapshot))
+        except Exception as e:
+            logger.error(f"Tick store append failed: {e}")
+
+    frame = snapshot_frame(snapshot) if warehouse is not None or alerts is not None else None
+    if warehouse is not None:
+        try:
+            with metrics.span("quotes.warehouse") as s:
+                s.add(rows=warehouse.write("quotes", frame, partition_by=["date"], source="custom_quotes"))
+        except Exception as e:
+            logger.error(f"Warehouse write failed: {e}")
+    if alerts is not None:
+        try:
+            with metrics.span("quotes.alerts") as s:
+                s.add(rows=len(alerts.update(frame)))
+        except Exception as e:
+            logger.error(f"Alert evaluation failed: {e}")
+
+
+@metrics.timed("quotes.price_history")
+def get_price_history(symbols_list, years=3):
+    """Daily candles for *symbols_list* over the last *years* years, as one long DataFrame.
+
+    Columns: symbol, date, open, high, low, close, volume. Symbols the API has no data for are
+    logged and left out.
+    """
+    import requests
+    import pandas as pd
+
+    headers = {"Authorization": f"Bearer {load_access_token()}"}
+    frames = []
+    for symbol in symbols_list:
+        with metrics.span("quotes.history_http", symbol=symbol) as s:
+            response = requests.get(
+                f"{base_url()}/pricehistory",
+                params={"symbol": symbol, "periodType": "year", "period": years,
+                        "frequencyType": "daily", "frequency": 1},
+                headers=headers
+            )
+            s.add(bytes=len(response.content))
+        if response.status_code != 200:
+            logger.error(f"Price history for {symbol} failed: {response.status_code} - {response.text}")
+            continue
+        candles = response.json().get("candles", [])
+        if not candles:
+            logger.warning(f"No price history returned for {symbol}")
+            continue
+        frame = pd.DataFrame(candles)
+        frame["date"] = pd.to_datetime(frame.pop("datetime"), unit="ms").dt.normalize()
+        frames.append(frame.assign(symbol=symbol))
+
+    columns = ["symbol", "date", "open", "high", "low", "close", "volume"]
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)[columns]
+
+
+def snapshot_frame(snapshot, ts=None):
+    """Numeric DataFrame of a ``{symbol: quote}`` snapshot, as stored in the warehouse.
+
+    Numeric columns are always float64: the API sends whole numbers as JSON ints, and a column
+    typed by whichever snapshot came first would not accept later fractional values.
+    """
+    import pandas as pd
+
+    ts = pd.Timestamp(ts or datetime.now())
+    frame = pd.DataFrame({
+        "ts": ts,
+        "date": ts.strftime("%Y-%m-%d"),
+        "symbol": list(snapshot),
+        "last": [q.get("lastPrice", 0.0) for q in snapshot.values()],
+        "close": [q.get("closePrice", q.get("lastPrice", 0.0)) for q in snapshot.values()],
+        "volume": [q.get("totalVolume", 0) for q in snapshot.values()],
+        "high_52w": [q.get("52WeekHigh", 0.0) for q in snapshot.values()],
+        "low_52w": [q.get("52WeekLow", 0.0) for q in snapshot.values()],
+        "market_cap": [q.get("marketCap", 0) for q in snapshot.values()],
+    })
+    numeric = ["last", "close", "volume", "high_52w", "low_52w", "market_cap"]
+    return frame.astype({c: "float64" for c in numeric})
+
+
+ALERT_SETTINGS = ("ALERT_RULES", "ALERT_FILE", "ALERT_WEBHOOK", "ALERT_STATE")
+
+
+def build_alerts(warehouse=None, enabled=False):
+    """Alert engine configured from the environment, or ``None`` when alerting is off.
+
+    Alerting is on when *enabled* (``--alerts``) or any of :data:`ALERT_SETTINGS` is set; a
+    plain quote run evaluates no rules and writes no state. Rules come from the JSON file at ``$ALERT_RULES`` (default: ``alerts.DEFAULT_RULES``). Alerts
+    are always logged, appended to ``$ALERT_FILE`` and POSTed to ``$ALERT_WEBHOOK`` when those are
+    set. With a *warehouse*, the 30-day average volume per symbol is available to rules as
+    ``avg_volume_30d``. Per-symbol state is restored from :func:`alert_state_path`, so
+    ``prev()`` and the crossing rules compare against the previous run in one-shot mode.
+    """
+    if not enabled and not any(os.getenv(name) for name in ALERT_SETTINGS):
+        return None
+    import alerts
+
+    rules = alerts.load_rules(os.getenv("ALERT_RULES")) if os.getenv("ALERT_RULES") else alerts.DEFAULT_RULES
+    sinks = [alerts.LogSink()]
+    if os.getenv("ALERT_FILE"):
+        sinks.append(alerts.FileSink(os.getenv("ALERT_FILE")))
+    if os.getenv("ALERT_WEBHOOK"):
+        sinks.append(alerts.WebhookSink(os.getenv("ALERT_WEBHOOK")))
+
+    reference = None
+    if warehouse is not None and "quotes" in warehouse.tables():
+        reference = alerts.volume_baseline(warehouse)
+    engine = alerts.AlertEngine(rules, sinks, reference=reference)
+    try:
+        engine.load_state(alert_state_path())
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable alert state {alert_state_path()}: {e}")
+    return engine
+
 
-def display_results(df):
-    """Display formatted results."""
+def alert_state_path() -> str:
+    """Where the alert engine's state is kept: ``$ALERT_STATE``, else next to the tick store."""
+    if os.getenv("ALERT_STATE"):
+        return os.getenv("ALERT_STATE")
+    return os.path.join(os.getenv("TICK_STORE_DIR") or ".", "alert_state.npz")
+
+
+def save_alert_state(engine):
+    """Persist *engine*'s state to :func:`alert_state_path` (logged, never raised)."""
+    if engine is None:
+        return
+    try:
+        engine.save_state(alert_state_path())
+    except Exception as e:
+        logger.error(f"Saving alert state to {alert_state_path()} failed: {e}")
+
+
+def display_results(df, universe=None):
+    """Display formatted results, one sorted table per group of *universe* (a :class:`universe.Universe`)."""
     if df is None or df.empty:
         print("No data to display")
         return
 
-    auto_stocks = df[~df['Symbol'].isin(['^GSPC', 'CARZ', 'IDRV'])].copy()
-    indices_etfs = df[df['Symbol'].isin(['^GSPC', 'CARZ', 'IDRV'])].copy()
-    
+    if universe is None:
+        from universe import Universe
+        universe = Universe("quotes", "Quotes", [{"title": "Quotes", "summary": True,
+                                                  "symbols": dict(zip(df['Symbol'], df['Company']))}])
+
     print("\n" + "="*120)
-    print("EUROPEAN AUTO MANUFACTURERS & MARKET INDICES - CURRENT SESSION")
+    print(f"{universe.title.upper()} - CURRENT SESSION")
     print("="*120)
     print(f"Data as of: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print("-"*120)
 
-    if not indices_etfs.empty:
-        print("\nMARKET INDICES & AUTO ETFs:")
-        print("-"*120)
-        indices_sorted = indices_etfs.sort_values('Change_%', ascending=False)
-        
-        print(f"{'Symbol':<8} {'Name':<35} {'Price':<10} {'Change%':<10} {'Volume':<15} {'52W High':<10} {'52W Low':<10}")
-        print("-"*120)
-        
-        for _, row in indices_sorted.iterrows():
-            change_str = f"{row['Change_%']:+.2f}%"
-            print(f"{row['Symbol']:<8} {row['Company'][:34]:<35} "
-                  f"${row['Last_Price']:<9.2f} {change_str:<10} "
-                  f"{row['Volume']:<15} ${row['52W_High']:<9.2f} ${row['52W_Low']:<9.2f}")
-
-    if not auto_stocks.empty:
-        print(f"\nEUROPEAN AUTO MANUFACTURERS:")
+    summaries = []
+    for group in universe.groups:
+        rows = df[df['Symbol'].isin(list(group['symbols']))]
+        if rows.empty:
+            continue
+        print(f"\n{group['heading']}:")
         print("-"*120)
-        auto_sorted = auto_stocks.sort_values('Change_%', ascending=False)
+        rows_sorted = rows.sort_values('Change_%', ascending=False)
         
-        print(f"{'Symbol':<8} {'Company':<35} {'Price':<10} {'Change%':<10} {'Volume':<15} {'52W High':<10} {'52W Low':<10}")
+        print(f"{'Symbol':<8} {group['name_header']:<35} {'Price':<10} {'Change%':<10} {'Volume':<15} {'52W High':<10} {'52W Low':<10}")
         print("-"*120)
         
-        for _, row in auto_sorted.iterrows():
+        for _, row in rows_sorted.iterrows():
             change_str = f"{row['Change_%']:+.2f}%"
             print(f"{row['Symbol']:<8} {row['Company'][:34]:<35} "
                   f"${row['Last_Price']:<9.2f} {change_str:<10} "
                   f"{row['Volume']:<15} ${row['52W_High']:<9.2f} ${row['52W_Low']:<9.2f}")
+        if group['summary']:
+            summaries.append((group, rows_sorted))
     
     print("-"*120)
 
-    if not auto_stocks.empty:
-        avg_change = auto_stocks['Change_%'].mean()
-        best = auto_sorted.iloc[0]
-        worst = auto_sorted.iloc[-1]
+    for group, rows_sorted in summaries:
+        avg_change = rows_sorted['Change_%'].mean()
+        best = rows_sorted.iloc[0]
+        worst = rows_sorted.iloc[-1]
         
-        print(f"\nEUROPEAN AUTO MANUFACTURERS SUMMARY:")
+        print(f"\n{group['title'].upper()} SUMMARY:")
         print(f"Best performer: {best['Symbol']} ({best['Company'][:30]}) {best['Change_%']:+.2f}%")
         print(f"Worst performer: {worst['Symbol']} ({worst['Company'][:30]}) {worst['Change_%']:+.2f}%")
         print(f"Average change: {avg_change:+.2f}%")
 
-        positive = len(auto_stocks[auto_stocks['Change_%'] > 0])
-        negative = len(auto_stocks[auto_stocks['Change_%'] < 0])
-        unchanged = len(auto_stocks[auto_stocks['Change_%'] == 0])
+        positive = len(rows_sorted[rows_sorted['Change_%'] > 0])
+        negative = len(rows_sorted[rows_sorted['Change_%'] < 0])
+        unchanged = len(rows_sorted[rows_sorted['Change_%'] == 0])
+
+        print(f"{group['summary_label']}: {positive} up, {negative} down, {unchanged} unchanged")
+
+
+def watch(coordinator, interval=1.0, fps=4.0, **quote_kw):
+    """Poll *coordinator* every *interval* seconds into a :class:`live_view.LiveDashboard` until Ctrl-C.
+
+    Fetching runs on a background thread; the dashboard repaints at most *fps* times per second
+    and shows every group of every universe. Log output goes to ``custom_quotes.log`` meanwhile
+    so it does not scribble over the table. A poll that fails (an expired token, the API being
+    down) is logged there and flagged in the dashboard's status line, which keeps showing the
+    last good data; polling carries on. *quote_kw* is passed through to :func:`get_quotes`.
+    """
+    import threading
+    from live_view import LiveDashboard
+
+    logger.remove()
+    logger.add("custom_quotes.log")
+
+    universes = coordinator.universes
+    title = universes[0].title if len(universes) == 1 else " / ".join(u.title for u in universes)
+    groups = [(g['title'].upper() if len(universes) == 1 else f"{u.name.upper()} - {g['title'].upper()}",
+               list(g['symbols']), g['summary'])
+              for u in universes for g in u.groups]
+    dash = LiveDashboard(f"{title.upper()} - LIVE", groups, fps=fps)
+    stop = threading.Event()
 
-        print(f"European auto stocks: {positive} up, {negative} down, {unchanged} unchanged")
+    def poll():
+        failures = 0
+        while not stop.is_set():
+            started = time.monotonic()
+            try:
+                df = coordinator.cycle(**quote_kw)
+                error = None if df is not None else "quote request failed"
+            except Exception as e:
+                logger.exception("Quote poll failed")
+                df, error = None, f"{type(e).__name__}: {e}"
+            if df is not None:
+                failures = 0
+                dash.update(df)
+                dash.status(None)
+            else:
+                failures += 1
+                dash.status(f"STALE - {failures} failed poll(s), last at {datetime.now():%H:%M:%S}: {error}")
+            stop.wait(max(0.0, interval - (time.monotonic() - started)))
+
+    fetcher = threading.Thread(target=poll, name="quotes-poll", daemon=True)
+    fetcher.start()
+    try:
+        dash.run(stop)
+    finally:
+        stop.set()
+        fetcher.join(timeout=interval + 5)
 
 
-def main():
+def main(argv=None):
     """Main function."""
+    import argparse
+    from dotenv import load_dotenv
+    from universe import Coordinator, active, available, load_universes
+
+    load_dotenv()  # before anything reads $UNIVERSE_DIR, $SCHWAB_MARKETDATA_URL, ...
+    parser = argparse.ArgumentParser(description="Schwab quotes for one or more watchlist universes.")
+    parser.add_argument("--universe", action="append", choices=available() + ["all"],
+                        help="universe to fetch (repeatable; 'all' for every one; "
+                             "default: $UNIVERSES, else eu_auto)")
+    parser.add_argument("--live", action="store_true", help="keep polling and show a live table")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between polls in --live mode")
+    parser.add_argument("--fps", type=float, default=4.0, help="maximum redraws per second in --live mode")
+    parser.add_argument("--alerts", action="store_true",
+                        help="evaluate alert rules on every update (implied by $ALERT_RULES, $ALERT_FILE, "
+                             "$ALERT_WEBHOOK or $ALERT_STATE); state is kept in $ALERT_STATE, "
+                             "else alert_state.npz next to the tick store or in the working directory")
+    parser.add_argument("--flush-every", type=float, default=60.0,
+                        help="seconds between warehouse writes in --live mode (snapshots are buffered)")
+    args = parser.parse_args(argv)
+
     try:
-        print("Schwab API - European Auto Manufacturers & Market Indices")
-        print("=========================================================")
+        names = args.universe or active()
+        coordinator = Coordinator(load_universes(None if names is None or "all" in names else names),
+                                  fetch=get_quotes)
+        banner = f"Schwab API - {', '.join(u.title for u in coordinator.universes)}"
+        print(banner)
+        print("=" * len(banner))
+
+        store = None
+        if os.getenv("TICK_STORE_DIR"):
+            from tick_store import TickStore
+            store = TickStore(os.getenv("TICK_STORE_DIR"))
 
-        symbols_list = list(SYMBOLS.keys())
+        from common.warehouse import WriteBuffer, default as default_warehouse
 
-        df = get_quotes(symbols_list)
+        warehouse = default_warehouse()
+        quote_kw = dict(store=store, warehouse=warehouse, alerts=build_alerts(warehouse, args.alerts))
+        if args.live:
+            if warehouse is not None:
+                quote_kw["warehouse"] = WriteBuffer(warehouse, flush_every=args.flush_every)
+            try:
+                watch(coordinator, args.interval, args.fps, **quote_kw)
+            finally:
+                save_alert_state(quote_kw["alerts"])
+                if warehouse is not None:
+                    try:
+                        quote_kw["warehouse"].flush()
+                    except Exception as e:
+                        logger.error(f"Final warehouse flush failed: {e}")
+                if store is not None:
+                    store.close()
+            return
+
+        results = {}
+        coordinator.subscribe(display_results)
+        coordinator.subscribe(lambda rows, u: results.__setitem__(u, rows))
+        df = coordinator.cycle(**quote_kw)
+        save_alert_state(quote_kw["alerts"])
+        if store is not None:
+            store.close()
+            print(f"Ticks appended to {store.root}")
         
         if df is not None:
-            display_results(df)
-            
             save = input("\nSave to CSV? (y/N): ").strip().lower()
             if save in ['y', 'yes']:
-                filename = f"eu_auto_quotes_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-                df.to_csv(filename, index=False)
-                print(f"Data saved to {filename}")
+                stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+                for u, rows in results.items():
+                    filename = f"{u.prefix}_quotes_{stamp}.csv"
+                    rows.to_csv(filename, index=False)
+                    print(f"Data saved to {filename}")
         else:
             print("Failed to retrieve quotes")
             
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Technical indicators for the chart pipeline, computed from daily price history.
+
+:func:`technical_analysis` turns the long ``symbol, date, close, volume`` frame returned by
+``custom_quotes.get_price_history`` into one row per symbol with the columns ``create_charts``
+reads (``<prefix>_technical_analysis_*.csv``), plus the ``as_of`` date of each symbol's last
+session. Every indicator is a grouped rolling or shifted window over all symbols at once.
+
+Returns and price-vs-SMA figures are percentages; ``volatility_30d`` is the standard deviation
+of daily returns over the last 30 sessions, in percent. ``volume_vs_avg`` compares the last
+session's volume with its 20-session average (the chart's "vs 20-day Average"), while
+``avg_volume_30d`` is the 30-session average.
+"""
+import pandas as pd
+
+MONTH = 21  # trading sessions
+
+
+def technical_analysis(history: pd.DataFrame) -> pd.DataFrame:
+    """One row of indicators per symbol of *history* (columns symbol, date, close, volume)."""
+    h = history.sort_values(["symbol", "date"]).reset_index(drop=True)
+    g = h.groupby("symbol", sort=False)
+    close, volume = h["close"], h["volume"].astype(float)
+
+    def pct(now, then):
+        return (now / then - 1) * 100
+
+    out = pd.DataFrame({"symbol": h["symbol"], "date": h["date"], "current_price": close})
+    out["price_roc_1d"] = pct(close, g["close"].shift(1))
+    out["price_roc_1m"] = pct(close, g["close"].shift(MONTH))
+    out["price_roc_3y"] = pct(close, g["close"].transform("first"))
+
+    prior_year = h["date"].dt.year < h.groupby("symbol")["date"].transform("max").dt.year
+    year_end = h["close"].where(prior_year).groupby(h["symbol"]).transform("last")
+    out["price_roc_ytd"] = pct(close, year_end)
+
+    for n in (20, 50, 200):
+        sma = g["close"].rolling(n, min_periods=n).mean().reset_index(level=0, drop=True)
+        out[f"price_vs_sma{n}"] = pct(close, sma)
+
+    returns = g["close"].pct_change()
+    out["volatility_30d"] = (returns.groupby(h["symbol"]).rolling(30, min_periods=30).std()
+                             .reset_index(level=0, drop=True) * 100)
+    avg_volume = {n: g["volume"].rolling(n, min_periods=1).mean().reset_index(level=0, drop=True)
+                  for n in (20, 30)}
+    out["avg_volume_30d"] = avg_volume[30]
+    out["volume_vs_avg"] = pct(volume, avg_volume[20])
+    out["volume_roc_1d"] = pct(volume, g["volume"].shift(1))
+    out["volume_roc_1m"] = pct(volume, g["volume"].shift(MONTH))
+
+    last = out.groupby("symbol", sort=False).tail(1).rename(columns={"date": "as_of"})
+    return last.round({c: 4 for c in last.columns if c not in ("symbol", "as_of")}).reset_index(drop=True)
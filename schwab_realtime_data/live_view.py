@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Live terminal view of the quotes table, redrawn differentially at a capped frame rate.
+
+:meth:`LiveDashboard.update` is cheap and can be called as often as data arrives. It compares
+the incoming quotes with the table it already holds and applies only the rows that changed: a
+changed row is re-formatted and moved to its new position in its group's sorted order. The
+screen is painted by :meth:`LiveDashboard.run` at most ``fps`` times per second, and only when
+something changed. Only screen lines that differ from the previous frame are rewritten, using
+ANSI cursor addressing. When stdout is not a terminal, each frame is printed in full.
+
+Usage
+-----
+```python
+from live_view import LiveDashboard
+
+dash = LiveDashboard(fps=4)
+threading.Thread(target=feed, args=(dash,), daemon=True).start()   # feed() calls dash.update(df)
+dash.run()                                                          # until Ctrl-C
+```
+"""
+import bisect
+import shutil
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple
+
+COLUMNS = ["Company", "Last_Price", "Change_%", "Volume", "52W_High", "52W_Low"]
+_CHANGE = COLUMNS.index("Change_%")
+WIDTH = 120
+
+# (title, symbols or None for "everything not listed elsewhere", show summary); a symbol may be
+# listed in several groups
+DEFAULT_GROUPS: List[Tuple[str, Optional[Sequence[str]], bool]] = [("QUOTES", None, True)]
+
+_HEADER = (f"{'Symbol':<8} {'Company':<35} {'Price':<10} {'Change%':<10} "
+           f"{'Volume':<15} {'52W High':<10} {'52W Low':<10}")
+
+
+def _format_row(symbol, row) -> str:
+    company, last_price, change, volume, high_52w, low_52w = row
+    change_str = f"{change:+.2f}%"
+    return (f"{symbol:<8} {str(company)[:34]:<35} "
+            f"${last_price:<9.2f} {change_str:<10} "
+            f"{volume:<15} ${high_52w:<9.2f} ${low_52w:<9.2f}")
+
+
+class LiveDashboard:
+    """Sorted, incrementally updated quotes table with a frame-rate-capped painter."""
+
+    def __init__(self, title: str = "QUOTES - LIVE",
+                 groups=DEFAULT_GROUPS, fps: float = 4.0, out=None):
+        self.title = title
+        self.groups = [(t, set(s) if s is not None else None, summary) for t, s, summary in groups]
+        self.fps = fps
+        self.out = out or sys.stdout
+        self._lock = threading.Lock()
+        self._rows = {}                                     # symbol -> tuple of COLUMNS
+        self._group_of = {}                                 # symbol -> its group indices
+        self._order = [[] for _ in self.groups]             # sorted (-change, symbol) keys
+        self._lines = {}                                    # symbol -> formatted row
+        self._keys = {}                                     # symbol -> its key in _order
+        self._as_of = None
+        self._status = None
+        self._dirty = False
+        self._screen: List[str] = []
+        self._tty = hasattr(self.out, "isatty") and self.out.isatty()
+
+    # ------------------------------------------------------------------ state
+
+    def _groups(self, symbol) -> List[int]:
+        """Every group listing *symbol*, else the catch-all group (or the last one)."""
+        hits = [i for i, (_, members, _) in enumerate(self.groups) if members is not None and symbol in members]
+        return hits or [next((i for i, (_, m, _) in enumerate(self.groups) if m is None), len(self.groups) - 1)]
+
+    def update(self, df, as_of: Optional[datetime] = None) -> int:
+        """Merge a :func:`custom_quotes.get_quotes` frame; returns the number of rows that changed."""
+        if df is None or df.empty:
+            return 0
+        rows = zip(df["Symbol"], df[COLUMNS].itertuples(index=False, name=None))
+        with self._lock:
+            changed = [(symbol, row) for symbol, row in dict(rows).items() if self._rows.get(symbol) != row]
+            for symbol, row in changed:
+                self._rows[symbol] = row
+                groups = self._group_of.get(symbol)
+                if groups is None:
+                    groups = self._group_of[symbol] = self._groups(symbol)
+                else:
+                    for g in groups:
+                        order = self._order[g]
+                        order.pop(bisect.bisect_left(order, self._keys[symbol]))
+                key = self._keys[symbol] = (-float(row[_CHANGE]), symbol)
+                for g in groups:
+                    bisect.insort(self._order[g], key)
+                self._lines[symbol] = _format_row(symbol, row)
+            self._as_of = as_of or datetime.now()
+            self._dirty = True
+        return len(changed)
+
+    def status(self, message: Optional[str] = None):
+        """Show *message* (e.g. why the data is stale) next to the as-of time; ``None`` clears it."""
+        with self._lock:
+            if message != self._status:
+                self._status = message
+                self._dirty = True
+
+    # ------------------------------------------------------------------ drawing
+
+    def _summary(self, order) -> List[str]:
+        n = len(order)
+        changes = [-k for k, _ in order]
+        best, worst = order[0][1], order[-1][1]
+        name = lambda s: str(self._rows[s][0])[:30]
+        up = sum(c > 0 for c in changes)
+        down = sum(c < 0 for c in changes)
+        return ["",
+                f"Best performer: {best} ({name(best)}) {changes[0]:+.2f}%",
+                f"Worst performer: {worst} ({name(worst)}) {changes[-1]:+.2f}%",
+                f"Average change: {sum(changes) / n:+.2f}%",
+                f"{up} up, {down} down, {n - up - down} unchanged"]
+
+    def compose(self) -> List[str]:
+        """The current frame as a list of lines."""
+        with self._lock:
+            as_of = f"Data as of: {self._as_of:%Y-%m-%d %H:%M:%S}" if self._as_of else "Waiting for data..."
+            if self._status:
+                as_of = f"{as_of}  [{self._status}]"[:WIDTH]
+            lines = ["=" * WIDTH, self.title, "=" * WIDTH, as_of, "-" * WIDTH]
+            for (title, _, summary), order in zip(self.groups, self._order):
+                if not order:
+                    continue
+                lines += ["", f"{title}:", "-" * WIDTH, _HEADER, "-" * WIDTH]
+                lines += [self._lines[s] for _, s in order]
+                if summary:
+                    lines += self._summary(order)
+            lines.append("-" * WIDTH)
+            self._dirty = False
+        return lines
+
+    def draw(self):
+        """Paint the current frame, rewriting only lines that differ from the last one."""
+        lines = self.compose()
+        if not self._tty:
+            self.out.write("\n".join(lines) + "\n")
+            self.out.flush()
+            return
+        rows = shutil.get_terminal_size().lines - 1
+        lines = lines[:rows]
+        buf = [] if self._screen else ["\x1b[?25l\x1b[H\x1b[2J"]
+        for i, line in enumerate(lines):
+            if i >= len(self._screen) or self._screen[i] != line:
+                buf.append(f"\x1b[{i + 1};1H{line}\x1b[K")
+        if len(lines) < len(self._screen):
+            buf.append(f"\x1b[{len(lines) + 1};1H\x1b[J")
+        self._screen = lines
+        if buf:
+            self.out.write("".join(buf))
+            self.out.flush()
+
+    def run(self, stop: Optional[threading.Event] = None):
+        """Redraw at most ``fps`` times per second while there are changes, until *stop* is set."""
+        stop = stop or threading.Event()
+        period = 1.0 / self.fps
+        try:
+            while not stop.is_set():
+                started = time.monotonic()
+                if self._dirty:
+                    self.draw()
+                stop.wait(max(0.0, period - (time.monotonic() - started)))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if self._tty:
+                self.out.write(f"\x1b[{len(self._screen) + 1};1H\x1b[?25h\n")
+                self.out.flush()
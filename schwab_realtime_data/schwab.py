@@ -10,6 +10,8 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv()
 
+TOKEN_URL = os.getenv("SCHWAB_TOKEN_URL", "https://api.schwabapi.com/v1/oauth/token")
+
 
 def construct_init_auth_url() -> tuple[str, str, str]:
     """Construct the initial authentication URL using environment variables."""
@@ -75,7 +77,7 @@ def retrieve_tokens(headers, payload) -> dict:
     try:
         logger.info("Requesting tokens from Schwab API...")
         init_token_response = requests.post(
-            url="https://api.schwabapi.com/v1/oauth/token",
+            url=TOKEN_URL,
             headers=headers,
             data=payload,
         )
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Append-only tick log for polled quote snapshots, backed by memory-mapped NumPy arrays.
+
+Each symbol gets its own file of fixed-width records (``TICK_DTYPE``) so that appends are a
+single slot write and reads by symbol and time are a ``searchsorted`` slice of the mapping,
+i.e. a view rather than a copy. Symbols are interned to integer ids in ``symbols.json`` and the
+per-symbol record counts live in a small memory-mapped ``counts.i8`` array.
+
+Layout::
+
+    <root>/symbols.json     ["VWAGY", "MBGYY", ...]     list index == symbol id
+    <root>/counts.i8        int64[capacity]             committed records per symbol id
+    <root>/<id>.ticks       TICK_DTYPE[capacity]        records, non-decreasing in ts
+
+Usage
+-----
+```python
+from tick_store import TickStore
+
+with TickStore("ticks") as store:
+    store.append("VWAGY", last=11.2, close=11.32, volume=412837, high_52w=12.99, low_52w=8.63)
+    view = store.range("VWAGY", start="2025-08-01", end="2025-08-02")   # zero-copy
+    df = store.frame("VWAGY")                                          # pandas copy
+```
+"""
+import json
+import os
+import time
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+
+TICK_DTYPE = np.dtype([
+    ("ts", "M8[ns]"),
+    ("symbol_id", "<u4"),
+    ("last", "<f8"),
+    ("close", "<f8"),
+    ("volume", "<i8"),
+    ("high_52w", "<f8"),
+    ("low_52w", "<f8"),
+])
+
+_INITIAL_CAPACITY = 4096
+
+
+def _mapped(path: Path, dtype: np.dtype, min_len: int) -> np.memmap:
+    """Map *path* as a 1-D array of *dtype*, extending the file to at least *min_len* items."""
+    size = max(path.stat().st_size if path.exists() else 0, min_len * dtype.itemsize)
+    with open(path, "ab") as f:
+        f.truncate(size)
+    return np.memmap(path, dtype=dtype, mode="r+", shape=(size // dtype.itemsize,))
+
+
+def _as_ns(t=None) -> np.datetime64:
+    """*t* (anything ``np.datetime64`` accepts) in ns; the current UTC time when omitted."""
+    return np.datetime64(time.time_ns(), "ns") if t is None else np.datetime64(t, "ns")
+
+
+class TickStore:
+    """Memory-mapped, per-symbol, append-only store of quote ticks."""
+
+    def __init__(self, root: str = "ticks"):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        sym_path = self.root / "symbols.json"
+        self.symbols = json.loads(sym_path.read_text()) if sym_path.exists() else []
+        self._ids = {s: i for i, s in enumerate(self.symbols)}
+        self._counts = _mapped(self.root / "counts.i8", np.dtype("<i8"),
+                               max(len(self.symbols), 64))
+        self._logs = {}
+
+    # ------------------------------------------------------------------ symbols
+
+    def symbol_id(self, symbol: str) -> int:
+        """Return the id for *symbol*, registering it on first use."""
+        sid = self._ids.get(symbol)
+        if sid is not None:
+            return sid
+        sid = len(self.symbols)
+        self.symbols.append(symbol)
+        self._ids[symbol] = sid
+        if sid >= len(self._counts):
+            self._counts.flush()
+            self._counts = _mapped(self.root / "counts.i8", np.dtype("<i8"), 2 * len(self._counts))
+        tmp = self.root / "symbols.json.tmp"
+        tmp.write_text(json.dumps(self.symbols))
+        os.replace(tmp, self.root / "symbols.json")
+        return sid
+
+    def _log(self, sid: int, min_len: int = 0) -> np.memmap:
+        log = self._logs.get(sid)
+        if log is None or len(log) < min_len:
+            if log is not None:
+                log.flush()
+            cap = max(min_len, _INITIAL_CAPACITY, 2 * len(log) if log is not None else 0)
+            log = self._logs[sid] = _mapped(self.root / f"{sid}.ticks", TICK_DTYPE, cap)
+        return log
+
+    # ------------------------------------------------------------------ writes
+
+    def append(self, symbol: str, *, last: float, close: float, volume: int = 0,
+               high_52w: float = 0.0, low_52w: float = 0.0, ts=None):
+        """Append one tick for *symbol*; *ts* defaults to now and must not go backwards."""
+        sid = self.symbol_id(symbol)
+        n = int(self._counts[sid])
+        ts = _as_ns(ts)
+        log = self._log(sid, n + 1)
+        if n and ts < log["ts"][n - 1]:
+            raise ValueError(f"{symbol}: tick at {ts} is older than the last one ({log['ts'][n - 1]})")
+        log[n] = (ts, sid, last, close, volume, high_52w, low_52w)
+        self._counts[sid] = n + 1
+
+    def append_quotes(self, quotes: dict, ts=None):
+        """Append a snapshot ``{symbol: schwab_quote_dict}`` with one shared timestamp."""
+        ts = _as_ns(ts)
+        for symbol, q in quotes.items():
+            last = q.get("lastPrice", 0.0)
+            self.append(symbol, last=last, close=q.get("closePrice", last),
+                        volume=q.get("totalVolume", 0), high_52w=q.get("52WeekHigh", 0.0),
+                        low_52w=q.get("52WeekLow", 0.0), ts=ts)
+
+    def flush(self):
+        self._counts.flush()
+        for log in self._logs.values():
+            log.flush()
+
+    def close(self):
+        self.flush()
+        self._logs.clear()
+
+    def __enter__(self) -> "TickStore":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ------------------------------------------------------------------ reads
+
+    def __len__(self) -> int:
+        return int(self._counts[:len(self.symbols)].sum())
+
+    def count(self, symbol: str) -> int:
+        sid = self._ids.get(symbol)
+        return 0 if sid is None else int(self._counts[sid])
+
+    def range(self, symbol: str, start=None, end=None) -> np.ndarray:
+        """Ticks of *symbol* with ``start <= ts < end`` as a view into the mapping (no copy)."""
+        sid = self._ids.get(symbol)
+        if sid is None:
+            return np.empty(0, dtype=TICK_DTYPE)
+        n = int(self._counts[sid])
+        ticks = self._log(sid)[:n]
+        lo = 0 if start is None else int(np.searchsorted(ticks["ts"], _as_ns(start), "left"))
+        hi = n if end is None else int(np.searchsorted(ticks["ts"], _as_ns(end), "left"))
+        return ticks[lo:hi]
+
+    def latest(self, symbols: Optional[Iterable[str]] = None) -> np.ndarray:
+        """Most recent tick of each symbol (a new array, one record per symbol that has data)."""
+        out = [self._log(self._ids[s])[int(self._counts[self._ids[s]]) - 1]
+               for s in (symbols if symbols is not None else self.symbols)
+               if self.count(s)]
+        return np.array(out, dtype=TICK_DTYPE)
+
+    def frame(self, symbol: str, start=None, end=None):
+        """:meth:`range` as a pandas DataFrame indexed by ``ts`` (copies)."""
+        import pandas as pd
+
+        return pd.DataFrame(self.range(symbol, start, end)).set_index("ts")
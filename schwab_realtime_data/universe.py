@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Watchlist universes loaded from config files, and a coordinator that fetches them together.
+
+A universe is a JSON file in ``universes/`` (or ``$UNIVERSE_DIR``, read when universes are
+looked up so a ``.env`` loaded by the caller applies)::
+
+    {
+      "title": "European Auto Manufacturers & Market Indices",
+      "prefix": "eu_auto",                       # file prefix for CSVs and charts
+      "chart_title": "European Auto Manufacturers",   # optional, defaults to title
+      "groups": [
+        {"title": "Market Indices & Auto ETFs", "symbols": {"^GSPC": "S&P 500 Index"},
+         "heading": "MARKET INDICES & AUTO ETFs",    # optional, defaults to the upper-cased title
+         "name_header": "Name"},                     # optional, defaults to "Company"
+        {"title": "European Auto Manufacturers", "summary": true,
+         "summary_label": "European auto stocks",    # optional, defaults to title
+         "symbols": {"VWAGY": "Volkswagen AG"}}
+      ]
+    }
+
+Scripts fetch the universes listed in ``$UNIVERSES`` (comma-separated, or ``all``) when none are
+named on the command line, and ``eu_auto`` when that is unset too.
+
+:class:`Coordinator` takes the union of the symbols of every active universe and fetches each
+symbol once per cycle. It then hands every universe the rows of its own symbols, labelled with
+that universe's names, through the callbacks subscribed to it (display, CSV export, ...).
+``create_charts.py`` draws each universe's charts under its ``chart_title`` and ``prefix``.
+
+Usage
+-----
+```python
+from universe import Coordinator, load_universes
+
+coord = Coordinator(load_universes(["eu_auto", "us_auto"]), fetch=get_quotes)
+coord.subscribe(display_results)                 # every universe
+coord.cycle()
+```
+"""
+import json
+import os
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+DEFAULT_UNIVERSE_DIR = Path(__file__).resolve().parent / "universes"
+DEFAULT_ACTIVE = ["eu_auto"]
+
+
+def universe_dir() -> Path:
+    """``$UNIVERSE_DIR`` if set, else the bundled ``universes/`` directory."""
+    return Path(os.getenv("UNIVERSE_DIR") or DEFAULT_UNIVERSE_DIR)
+
+
+class Universe:
+    """A named watchlist made of titled symbol groups."""
+
+    def __init__(self, name: str, title: str, groups: List[dict], prefix: Optional[str] = None,
+                 chart_title: Optional[str] = None):
+        self.name = name
+        self.title = title
+        self.prefix = prefix or name
+        self.chart_title = chart_title or title
+        self.groups = [{"title": g["title"], "symbols": dict(g["symbols"]),
+                        "summary": bool(g.get("summary", False)),
+                        "heading": g.get("heading", g["title"].upper()),
+                        "name_header": g.get("name_header", "Company"),
+                        "summary_label": g.get("summary_label", g["title"])} for g in groups]
+        self.symbols: Dict[str, str] = {}
+        for g in self.groups:
+            for symbol, company in g["symbols"].items():
+                self.symbols.setdefault(symbol, company)
+
+    @classmethod
+    def from_file(cls, path) -> "Universe":
+        path = Path(path)
+        spec = json.loads(path.read_text())
+        return cls(spec.get("name", path.stem), spec["title"], spec["groups"], spec.get("prefix"),
+                   spec.get("chart_title"))
+
+    def select(self, df):
+        """Rows of a :func:`custom_quotes.get_quotes` frame in this universe, with its own names."""
+        part = df[df["Symbol"].isin(list(self.symbols))]
+        return part.assign(Company=part["Symbol"].map(self.symbols))
+
+    def __repr__(self):
+        return f"Universe({self.name!r}, {len(self.symbols)} symbols)"
+
+
+def available(directory=None) -> List[str]:
+    """Names of the universe files in *directory* (default :func:`universe_dir`)."""
+    return sorted(p.stem for p in Path(directory or universe_dir()).glob("*.json"))
+
+
+def active() -> Optional[List[str]]:
+    """Universes to use when none are named: ``$UNIVERSES``, else :data:`DEFAULT_ACTIVE`.
+
+    ``None`` means all of them (``UNIVERSES=all``).
+    """
+    names = [n.strip() for n in os.getenv("UNIVERSES", "").split(",") if n.strip()]
+    if "all" in names:
+        return None
+    return names or list(DEFAULT_ACTIVE)
+
+
+def load_universes(names: Optional[Sequence[str]] = None, directory=None) -> List[Universe]:
+    """Load the universes called *names* (all of them by default) from *directory*."""
+    directory = Path(directory or universe_dir())
+    names = list(names) if names else available(directory)
+    missing = [n for n in names if not (directory / f"{n}.json").exists()]
+    if missing:
+        raise FileNotFoundError(f"no universe {', '.join(missing)} in {directory} "
+                                f"(have: {', '.join(available(directory))})")
+    return [Universe.from_file(directory / f"{n}.json") for n in names]
+
+
+class Coordinator:
+    """Fetch the union of several universes once per cycle and fan the rows out to each."""
+
+    def __init__(self, universes: Sequence[Universe], fetch: Callable):
+        self.universes = list(universes)
+        self.fetch = fetch
+        self.symbols: Dict[str, str] = {}
+        for u in self.universes:
+            for symbol, company in u.symbols.items():
+                self.symbols.setdefault(symbol, company)
+        self._subscribers = {u.name: [] for u in self.universes}
+
+    def subscribe(self, callback: Callable, universe: Optional[str] = None):
+        """Call ``callback(rows, universe)`` after every cycle, for one universe or all of them."""
+        for name in ([universe] if universe else self._subscribers):
+            self._subscribers[name].append(callback)
+
+    def cycle(self, **fetch_kw):
+        """Fetch every symbol once and deliver each universe its rows; returns the full frame."""
+        df = self.fetch(list(self.symbols), names=self.symbols, **fetch_kw)
+        if df is None:
+            return None
+        for u in self.universes:
+            part = u.select(df)
+            for callback in self._subscribers[u.name]:
+                callback(part, u)
+        return df